@@ -13,6 +13,12 @@ from app.models.services import Service as ServiceModel, ServiceEndpoint
 from app.models.service_schemas import ServiceType
 from sqlalchemy.dialects.postgresql import insert
 
+# Prefer the libyaml C loader; fall back to the pure-Python implementation
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 logger = logging.getLogger(__name__)
 
 
@@ -98,7 +104,7 @@ class ServiceDiscovery:
                 return None
 
             # Parse YAML
-            service_data = yaml.safe_load(service_yaml)
+            service_data = yaml.load(service_yaml, Loader=SafeLoader)
             if not service_data or "service" not in service_data:
                 logger.warning(
                     f"Invalid service.yaml in ConfigMap {configmap.metadata.name}: {service_data}"
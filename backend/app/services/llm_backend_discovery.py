@@ -16,6 +16,12 @@ import yaml
 
 from app.api.llm.schemas import BackendEntry
 
+# Prefer the libyaml C loader; fall back to the pure-Python implementation
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
 logger = logging.getLogger(__name__)
 
 
@@ -65,7 +71,7 @@ class LLMBackendDiscovery:
         if not self._static_backends_raw:
             return
         try:
-            entries = yaml.safe_load(self._static_backends_raw)
+            entries = yaml.load(self._static_backends_raw, Loader=SafeLoader)
             if not isinstance(entries, list):
                 return
             for entry in entries:
@@ -201,7 +207,7 @@ class LLMBackendDiscovery:
                 if not cm.data or "service.yaml" not in cm.data:
                     continue
 
-                svc_data = yaml.safe_load(cm.data["service.yaml"])
+                svc_data = yaml.load(cm.data["service.yaml"], Loader=SafeLoader)
                 namespace = cm.metadata.namespace
 
                 endpoints = svc_data.get("endpoints", {})
@@ -26,6 +26,14 @@ from thinkube_yaml_validator import (
     validate_replicas as _validate_replicas,
 )
 
+# Prefer the libyaml C bindings; fall back to the pure-Python implementation.
+# The to_yaml filter keeps PyYAML's full Dumper (as yaml.dump's default), only
+# C-accelerated.
+try:
+    from yaml import CSafeLoader as SafeLoader, CDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader, Dumper
+
 logger = logging.getLogger(__name__)
 
 # Path to the J2 templates used by the deployment system
@@ -93,6 +101,33 @@ def _get_custom_objects_client():
     return client.CustomObjectsApi()
 
 
+_jinja_env: Optional[jinja2.Environment] = None
+
+
+def _get_jinja_env() -> jinja2.Environment:
+    """Return the process-wide Jinja2 environment for the k8s templates.
+
+    Built on first use so each template is parsed and compiled once per
+    backend process instead of on every regeneration. auto_reload stays on:
+    the backend is long-lived, and a template updated on disk is recompiled
+    after a cheap mtime check.
+    """
+    global _jinja_env
+    if _jinja_env is None:
+        if not TEMPLATES_DIR.exists():
+            raise FileNotFoundError(f"Templates directory not found: {TEMPLATES_DIR}")
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(str(TEMPLATES_DIR)),
+            undefined=jinja2.StrictUndefined,
+            lstrip_blocks=True,
+            trim_blocks=True
+        )
+        env.filters['to_yaml'] = lambda x: yaml.dump(x, Dumper=Dumper, default_flow_style=False)
+        env.filters['to_json'] = lambda x: json.dumps(x)
+        _jinja_env = env
+    return _jinja_env
+
+
 class ManifestGenerator:
     """Generates K8s manifests from thinkube.yaml for an existing app."""
 
@@ -247,7 +282,7 @@ class ManifestGenerator:
 
         # Parse thinkube.yaml
         with open(thinkube_path, 'r') as f:
-            self.thinkube_config = yaml.safe_load(f)
+            self.thinkube_config = yaml.load(f, Loader=SafeLoader)
 
         # Inject metadata.name
         if 'metadata' not in self.thinkube_config:
@@ -278,19 +313,7 @@ class ManifestGenerator:
         # Build manifest_params from app-metadata ConfigMap (parameters from original deploy)
         manifest_params = self._read_manifest_params()
 
-        # Setup Jinja2
-        templates_dir = TEMPLATES_DIR
-        if not templates_dir.exists():
-            raise FileNotFoundError(f"Templates directory not found: {templates_dir}")
-
-        env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(str(templates_dir)),
-            undefined=jinja2.StrictUndefined,
-            lstrip_blocks=True,
-            trim_blocks=True
-        )
-        env.filters['to_yaml'] = lambda x: yaml.dump(x, default_flow_style=False)
-        env.filters['to_json'] = lambda x: json.dumps(x)
+        env = _get_jinja_env()
 
         container_registry = f"registry.{self.domain}"
         admin_username = os.environ.get('ADMIN_USERNAME', 'tkadmin')
@@ -0,0 +1,497 @@
+"""Cluster-free checks for scripts/deploy_application.py.
+
+The script is imported from its path. When the cluster/HTTP client packages
+it imports are not installed, minimal stand-in modules are registered first;
+the tested methods only ever talk to the fakes defined here.
+"""
+
+import asyncio
+import base64
+import importlib.util
+import json
+import subprocess
+import sys
+import types
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import yaml
+
+SCRIPT = Path(__file__).resolve().parents[2] / "scripts" / "deploy_application.py"
+
+# Hard imports of the script that are only used to talk to a cluster or Gitea
+STAND_IN_PACKAGES = {
+    "aiohttp": ("aiohttp",),
+    "kubernetes_asyncio": (
+        "kubernetes_asyncio",
+        "kubernetes_asyncio.client",
+        "kubernetes_asyncio.client.rest",
+        "kubernetes_asyncio.config",
+        "kubernetes_asyncio.stream",
+        "kubernetes_asyncio.watch",
+    ),
+}
+
+
+class _StandInApiException(Exception):
+    """Same constructor as kubernetes_asyncio's ApiException."""
+
+    def __init__(self, status=None, reason=None, http_resp=None):
+        super().__init__(status, reason)
+        self.status = status
+        self.reason = reason
+
+
+def _stand_in(name):
+    """An empty module whose public attributes resolve to placeholder classes."""
+    module = types.ModuleType(name)
+
+    def __getattr__(attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return type(attr, (), {})
+
+    module.__getattr__ = __getattr__
+    return module
+
+
+def _install_stand_ins(monkeypatch):
+    for package, names in STAND_IN_PACKAGES.items():
+        try:
+            for name in names:
+                importlib.import_module(name)
+        except ImportError:
+            modules = {name: _stand_in(name) for name in names}
+            for name, module in modules.items():
+                parent, _, child = name.rpartition(".")
+                if parent:
+                    setattr(modules[parent], child, module)
+                monkeypatch.setitem(sys.modules, name, module)
+            if package == "kubernetes_asyncio":
+                modules["kubernetes_asyncio.client.rest"].ApiException = _StandInApiException
+
+
+@pytest.fixture
+def load_script(monkeypatch, tmp_path):
+    """Import a fresh copy of the script (the Jinja bytecode cache goes to tmp_path)."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    _install_stand_ins(monkeypatch)
+
+    def load():
+        spec = importlib.util.spec_from_file_location("deploy_application_under_test", SCRIPT)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    return load
+
+
+def _secret(resource_version):
+    return SimpleNamespace(metadata=SimpleNamespace(resource_version=resource_version))
+
+
+def _deployer(module, thinkube_yaml="spec: {}\n", rv="1", **params):
+    deployer = module.ApplicationDeployer({
+        "app_name": "demo",
+        "deployment_id": "d1",
+        "deployment_namespace": "demo",
+        "domain_name": "example.com",
+        "admin_username": "tkadmin",
+        "template_url": "https://example.com/template",
+        **params,
+    })
+    deployer._thinkube_yaml_raw = thinkube_yaml
+    deployer.secrets = {
+        "admin": _secret(rv),
+        "wildcard_cert": _secret("10"),
+        "harbor": _secret("20"),
+        "mlflow": {"secret": _secret("30")},
+    }
+    return deployer
+
+
+def test_yaml_falls_back_to_pure_python_without_libyaml(load_script, monkeypatch):
+    monkeypatch.delattr(yaml, "CSafeLoader", raising=False)
+    monkeypatch.delattr(yaml, "CDumper", raising=False)
+    module = load_script()
+    assert module.SafeLoader is yaml.SafeLoader
+    assert module.Dumper is yaml.Dumper
+
+
+def test_to_yaml_filter_accepts_non_plain_values(load_script):
+    # The full Dumper (not the safe one) is used, as with yaml.dump's default
+    to_yaml = load_script()._JINJA_ENV.filters["to_yaml"]
+    assert "PosixPath" in to_yaml({"path": Path("/data")})
+
+
+def test_state_hash_is_stable_for_same_inputs(load_script):
+    module = load_script()
+    assert _deployer(module)._compute_state_hash() == _deployer(module)._compute_state_hash()
+
+
+def test_state_hash_changes_with_thinkube_yaml(load_script):
+    module = load_script()
+    assert (_deployer(module)._compute_state_hash()
+            != _deployer(module, thinkube_yaml="spec: {replicas: 2}\n")._compute_state_hash())
+
+
+def test_state_hash_changes_when_a_source_secret_rotates(load_script):
+    module = load_script()
+    assert _deployer(module, rv="1")._compute_state_hash() != _deployer(module, rv="2")._compute_state_hash()
+
+
+@pytest.mark.parametrize("param", [
+    {"domain_name": "example.org"},
+    {"admin_username": "other"},
+    {"model_id": "m2"},
+])
+def test_state_hash_changes_with_any_deployment_parameter(load_script, param):
+    module = load_script()
+    assert _deployer(module)._compute_state_hash() != _deployer(module, **param)._compute_state_hash()
+
+
+def test_state_hash_ignores_the_deployment_id(load_script):
+    module = load_script()
+    assert _deployer(module)._compute_state_hash() == _deployer(module, deployment_id="d2")._compute_state_hash()
+
+
+class _FakeCore:
+    def __init__(self, data=None, status=None, exc_type=None):
+        self.data = data
+        self.status = status
+        self.exc_type = exc_type
+
+    async def read_namespaced_config_map(self, name, namespace):
+        assert (name, namespace) == ("demo-deploy-state", "demo")
+        if self.status is not None:
+            raise self.exc_type(status=self.status)
+        return SimpleNamespace(data=self.data)
+
+
+def test_deploy_state_matches_stored_hash(load_script):
+    module = load_script()
+    deployer = _deployer(module)
+    state_hash = deployer._compute_state_hash()
+    deployer.k8s_core = _FakeCore(data={"state_hash": state_hash})
+    assert asyncio.run(deployer._deploy_state_matches(state_hash)) is True
+    assert asyncio.run(deployer._deploy_state_matches("other")) is False
+
+
+def test_missing_deploy_state_configmap_means_changed(load_script):
+    module = load_script()
+    deployer = _deployer(module)
+    deployer.k8s_core = _FakeCore(status=404, exc_type=module.ApiException)
+    assert asyncio.run(deployer._deploy_state_matches("anything")) is False
+
+
+def test_json_falls_back_to_stdlib_without_orjson(load_script, monkeypatch):
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    module = load_script()
+    assert module._json_dumps is json.dumps
+    assert module._json_loads is json.loads
+
+
+def test_orjson_dumps_returns_str(load_script):
+    pytest.importorskip("orjson")
+    module = load_script()
+    encoded = module._json_dumps({"a": [1, "x"]})
+    assert isinstance(encoded, str)
+    assert module._json_loads(encoded) == {"a": [1, "x"]}
+
+
+class _FakeResponse:
+    def __init__(self, status, payload=None):
+        self.status = status
+        self.payload = payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def json(self):
+        return self.payload
+
+    async def text(self):
+        return ""
+
+
+class _FakeGitea:
+    """Records the webhook API calls made through the shared session."""
+
+    def __init__(self, hooks):
+        self.hooks = hooks
+        self.calls = []
+
+    def get(self, url, headers=None):
+        self.calls.append(("GET", url))
+        return _FakeResponse(200, self.hooks)
+
+    def post(self, url, headers=None, json=None):
+        self.calls.append(("POST", url))
+        return _FakeResponse(201, {"id": 99})
+
+    def delete(self, url, headers=None):
+        self.calls.append(("DELETE", url))
+        return _FakeResponse(204)
+
+    def patch(self, url, headers=None, json=None):
+        self.calls.append(("PATCH", url))
+        return _FakeResponse(200)
+
+
+HOOKS_URL = "https://git.example.com/api/v1/repos/thinkube-deployments/demo/hooks"
+WEBHOOK_URL = "https://argo-events.example.com/gitea"
+
+
+def _hook(hook_id, url=WEBHOOK_URL, events=("push",), active=True):
+    return {"id": hook_id, "config": {"url": url, "content_type": "json"}, "events": list(events), "active": active}
+
+
+def _configure_webhook(module, hooks):
+    deployer = _deployer(module)
+    deployer.secrets["gitea_plain"] = {"token": "t"}
+    deployer._webhook_secret = "s"
+    gitea = _FakeGitea(hooks)
+    deployer._http_session = lambda: gitea
+    asyncio.run(deployer.configure_webhook())
+    return gitea.calls
+
+
+def test_webhook_is_created_when_missing(load_script):
+    calls = _configure_webhook(load_script(), [_hook(1, url="https://other.example.com")])
+    assert calls == [("GET", HOOKS_URL), ("POST", HOOKS_URL)]
+
+
+def test_duplicate_webhooks_are_deleted_keeping_the_first(load_script):
+    hooks = [_hook(5), _hook(1, url="https://other.example.com"), _hook(6), _hook(7)]
+    calls = _configure_webhook(load_script(), hooks)
+    assert calls[0] == ("GET", HOOKS_URL)
+    assert sorted(calls[1:]) == [("DELETE", f"{HOOKS_URL}/6"), ("DELETE", f"{HOOKS_URL}/7")]
+
+
+def test_matching_webhook_is_left_alone(load_script):
+    assert _configure_webhook(load_script(), [_hook(5)]) == [("GET", HOOKS_URL)]
+
+
+def test_drifted_webhook_is_patched(load_script):
+    calls = _configure_webhook(load_script(), [_hook(5, active=False)])
+    assert calls == [("GET", HOOKS_URL), ("PATCH", f"{HOOKS_URL}/5")]
+
+
+
+def _b64(value):
+    return base64.b64encode(value.encode()).decode()
+
+
+class _FakeArgoCluster:
+    """Secrets plus the repo-server Deployment, as seen by the ArgoCD steps."""
+
+    def __init__(self, api_exception, secrets):
+        self.api_exception = api_exception
+        self.secrets = secrets
+        self.restarts = []
+
+    async def read_namespaced_secret(self, name, namespace):
+        if (name, namespace) not in self.secrets:
+            raise self.api_exception(status=404)
+        data = self.secrets[(name, namespace)]
+        return SimpleNamespace(data={k: _b64(v) for k, v in data.items()})
+
+    async def patch_namespaced_deployment(self, name, namespace, body):
+        self.restarts.append((name, namespace, body))
+
+
+def _deploy_argocd_app(module, monkeypatch, app_name, secrets):
+    cluster = _FakeArgoCluster(module.ApiException, secrets)
+    deployer = _deployer(module, app_name=app_name)
+    deployer.k8s_core = deployer.k8s_apps = cluster
+
+    async def apply_secret(body):
+        meta = body["metadata"]
+        cluster.secrets[(meta["name"], meta["namespace"])] = dict(body["stringData"])
+
+    async def create_application(ssh_repo_url):
+        pass
+
+    async def no_sleep(delay):
+        pass
+
+    deployer._apply_secret = apply_secret
+    deployer._create_argocd_application = create_application
+    monkeypatch.setattr(module.asyncio, "sleep", no_sleep)
+    asyncio.run(deployer.deploy_argocd_app())
+    return cluster
+
+
+def _repo_secret(app_name, key="KEY"):
+    url = f"ssh://git@git.example.com:2222/thinkube-deployments/{app_name}.git"
+    return {(f"gitea-{app_name}-ssh", "argocd"): {"url": url, "sshPrivateKey": key, "type": "git"}}
+
+
+SSH_KEY = {("gitea-ssh-key", "argo"): {"ssh-privatekey": "KEY"}}
+
+
+def test_repo_server_restarts_when_the_repo_secret_is_created(load_script, monkeypatch):
+    cluster = _deploy_argocd_app(load_script(), monkeypatch, "demo", dict(SSH_KEY))
+    assert ("gitea-demo-ssh", "argocd") in cluster.secrets
+    assert [(name, ns) for name, ns, _ in cluster.restarts] == [("argocd-repo-server", "argocd")]
+    annotations = cluster.restarts[0][2]["spec"]["template"]["metadata"]["annotations"]
+    assert list(annotations) == ["kubectl.kubernetes.io/restartedAt"]
+
+
+def test_new_app_sharing_the_ssh_key_still_restarts_repo_server(load_script, monkeypatch):
+    secrets = {**SSH_KEY, **_repo_secret("other")}
+    cluster = _deploy_argocd_app(load_script(), monkeypatch, "demo", secrets)
+    assert len(cluster.restarts) == 1
+
+
+def test_repo_server_restarts_when_the_ssh_key_changes(load_script, monkeypatch):
+    secrets = {**SSH_KEY, **_repo_secret("demo", key="OLD")}
+    cluster = _deploy_argocd_app(load_script(), monkeypatch, "demo", secrets)
+    assert cluster.secrets[("gitea-demo-ssh", "argocd")]["sshPrivateKey"] == "KEY"
+    assert len(cluster.restarts) == 1
+
+
+def test_unchanged_repo_secret_skips_the_restart(load_script, monkeypatch):
+    secrets = {**SSH_KEY, **_repo_secret("demo")}
+    cluster = _deploy_argocd_app(load_script(), monkeypatch, "demo", secrets)
+    assert cluster.restarts == []
+
+
+def _run_git(cwd, *args):
+    identity = ["-c", "user.name=t", "-c", "user.email=t@example.com"]
+    return subprocess.run(["git", *identity, *args], cwd=cwd, check=True,
+                          capture_output=True, text=True).stdout.strip()
+
+
+def _commit_file(repo, name, content):
+    (repo / name).write_text(content)
+    _run_git(repo, "add", "-A")
+    _run_git(repo, "commit", "-q", "-m", name)
+
+
+@pytest.fixture
+def git_push(load_script, tmp_path):
+    """Run _git_sync_and_push against a local bare remote; returns (remote, repo, push)."""
+    remote = tmp_path / "remote.git"
+    _run_git(tmp_path, "init", "-q", "--bare", "-b", "main", str(remote))
+    repo = tmp_path / "demo"
+    repo.mkdir()
+    deployer = _deployer(load_script())
+    deployer.local_repo_path = str(repo)
+    calls = []
+    git = deployer._git
+
+    async def recording_git(*args, **kwargs):
+        calls.append(args)
+        return await git(*args, **kwargs)
+
+    deployer._git = recording_git
+
+    def push(remote_url=str(remote)):
+        calls.clear()
+        asyncio.run(deployer._git_sync_and_push(remote_url))
+        return [args for args in calls if args[0] == "push"]
+
+    return remote, repo, push
+
+
+def test_first_push_to_empty_remote_is_not_forced(git_push):
+    remote, repo, push = git_push
+    (repo / "app.py").write_text("v1")
+    assert push() == [("push", "-u", "origin", "main")]
+    assert _run_git(remote, "rev-parse", "main") == _run_git(repo, "rev-parse", "HEAD")
+
+
+def test_redeploy_fast_forwards_without_force(git_push):
+    remote, repo, push = git_push
+    (repo / "app.py").write_text("v1")
+    push()
+    (repo / "app.py").write_text("v2")
+    assert push() == [("push", "-u", "origin", "main")]
+    assert _run_git(remote, "rev-parse", "main") == _run_git(repo, "rev-parse", "HEAD")
+
+
+def test_diverged_history_is_force_pushed(git_push, tmp_path):
+    remote, repo, push = git_push
+    other = tmp_path / "other"
+    other.mkdir()
+    _run_git(other, "init", "-q", "-b", "main")
+    _commit_file(other, "old.txt", "unrelated")
+    _run_git(other, "push", "-q", str(remote), "main")
+    (repo / "app.py").write_text("v1")
+    assert push() == [("push", "-u", "origin", "main", "--force")]
+    assert _run_git(remote, "rev-parse", "main") == _run_git(repo, "rev-parse", "HEAD")
+
+
+def test_fetch_failure_fails_before_pushing(git_push, tmp_path):
+    _, repo, push = git_push
+    (repo / "app.py").write_text("v1")
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        push(str(tmp_path / "missing.git"))
+    assert excinfo.value.cmd[:2] == ["git", "fetch"]
+
+def test_uvloop_is_optional(load_script, monkeypatch):
+    monkeypatch.setitem(sys.modules, "uvloop", None)
+    assert load_script().uvloop is None
+
+
+def test_asyncpg_is_optional(load_script, monkeypatch):
+    monkeypatch.setitem(sys.modules, "asyncpg", None)
+    assert load_script().asyncpg is None
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, sql):
+        self.statements.append(sql)
+
+    async def close(self):
+        pass
+
+
+def _manage_databases(module, monkeypatch, connect):
+    deployer = _deployer(module, app_name="my-app")
+    deployer.thinkube_config = {"spec": {"services": ["database"]}}
+    deployer.secrets["admin_plain"] = {"admin-username": "tkadmin", "admin-password": "pw"}
+    exec_calls = []
+
+    async def exec_in_pod(**kwargs):
+        exec_calls.append(kwargs["command"])
+
+    deployer._exec_in_pod = exec_in_pod
+    monkeypatch.setattr(module, "asyncpg", SimpleNamespace(connect=connect))
+    asyncio.run(deployer.manage_databases())
+    return exec_calls
+
+
+def test_database_is_recreated_over_asyncpg_with_short_connect_timeout(load_script, monkeypatch):
+    module = load_script()
+    conn = _FakeConnection()
+    connect_kwargs = {}
+
+    async def connect(**kwargs):
+        connect_kwargs.update(kwargs)
+        return conn
+
+    assert _manage_databases(module, monkeypatch, connect) == []
+    assert connect_kwargs["timeout"] == module.POSTGRES_CONNECT_TIMEOUT
+    assert module.POSTGRES_CONNECT_TIMEOUT <= 5
+    assert conn.statements == [
+        'DROP DATABASE IF EXISTS "my_app" WITH (FORCE)',
+        'CREATE DATABASE "my_app" OWNER tkadmin',
+    ]
+
+
+def test_unreachable_postgres_falls_back_to_psql_in_the_pod(load_script, monkeypatch):
+    async def connect(**kwargs):
+        raise OSError("connection refused")
+
+    exec_calls = _manage_databases(load_script(), monkeypatch, connect)
+    assert len(exec_calls) == 1
+    assert exec_calls[0][-2:] == ["-c", 'CREATE DATABASE "my_app" OWNER tkadmin']
@@ -0,0 +1,81 @@
+"""Rendered output of templates/k8s/ingress_generator.py.j2.
+
+The template renders a standalone Python script; each test renders it for a
+spec, runs it against a temporary repo path and checks the HTTPRoute it wrote.
+"""
+
+import json
+from pathlib import Path
+
+import jinja2
+import yaml
+
+TEMPLATE = Path(__file__).resolve().parents[2] / "templates" / "k8s" / "ingress_generator.py.j2"
+
+
+def _generate(tmp_path, spec):
+    env = jinja2.Environment()
+    env.filters["to_json"] = json.dumps
+    script = env.from_string(TEMPLATE.read_text()).render(
+        project_name="demo",
+        k8s_namespace="demo",
+        domain_name="example.com",
+        thinkube_spec=spec,
+        local_repo_path=str(tmp_path),
+    )
+    (tmp_path / "k8s").mkdir()
+    try:
+        exec(compile(script, str(TEMPLATE), "exec"), {"__name__": "__main__"})
+    except SystemExit:
+        pass
+    return (tmp_path / "k8s" / "ingress.yaml").read_text()
+
+
+def _rules(output):
+    return yaml.safe_load(output)["spec"]["rules"]
+
+
+def test_routes_resolve_target_container_ports(tmp_path):
+    spec = {"spec": {
+        "containers": [{"name": "web", "port": 80}, {"name": "api", "port": 8000}],
+        "routes": [{"path": "/api", "to": "api"}, {"path": "/", "to": "web"}],
+    }}
+    rules = _rules(_generate(tmp_path, spec))
+    assert [(r["matches"][0]["path"]["value"], r["backendRefs"][0]) for r in rules] == [
+        ("/api", {"name": "api", "port": 8000}),
+        ("/", {"name": "web", "port": 80}),
+    ]
+
+
+def test_routes_to_unknown_or_portless_containers_are_skipped(tmp_path):
+    spec = {"spec": {
+        "containers": [{"name": "web", "port": 80}, {"name": "worker"}],
+        "routes": [{"path": "/", "to": "web"}, {"path": "/w", "to": "worker"}, {"path": "/x", "to": "missing"}],
+    }}
+    rules = _rules(_generate(tmp_path, spec))
+    assert [r["matches"][0]["path"]["value"] for r in rules] == ["/"]
+
+
+def test_duplicate_container_names_use_first_definition(tmp_path):
+    spec = {"spec": {
+        "containers": [{"name": "web", "port": 80}, {"name": "web", "port": 9090}],
+        "routes": [{"path": "/", "to": "web"}],
+    }}
+    assert _rules(_generate(tmp_path, spec))[0]["backendRefs"][0]["port"] == 80
+
+
+def test_default_route_goes_to_first_container_with_port(tmp_path):
+    spec = {"spec": {"containers": [{"name": "worker"}, {"name": "web", "port": 3000}]}}
+    output = _generate(tmp_path, spec)
+    assert output.startswith("# Generated HTTPRoute configuration (Gateway API)\n")
+    route = yaml.safe_load(output)
+    assert route["spec"]["hostnames"] == ["demo.example.com"]
+    assert route["spec"]["rules"] == [{
+        "matches": [{"path": {"type": "PathPrefix", "value": "/"}}],
+        "backendRefs": [{"name": "web", "port": 3000}],
+    }]
+
+
+def test_no_route_needed_without_ports(tmp_path):
+    output = _generate(tmp_path, {"spec": {"containers": [{"name": "worker"}]}})
+    assert output.startswith("# No HTTPRoute needed")
@@ -0,0 +1,59 @@
+"""ManifestGenerator pieces that need no cluster.
+
+The shared Jinja environment and its to_yaml filter, and the libyaml import
+fallback.
+"""
+
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+import yaml
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+# In the pod the validator is imported from the mounted scripts/ directory
+sys.path.insert(0, str(REPO_ROOT / "scripts"))
+
+import app.services.manifest_generator as mg  # noqa: E402
+
+
+@pytest.fixture
+def templates_env(monkeypatch):
+    monkeypatch.setattr(mg, "TEMPLATES_DIR", REPO_ROOT / "templates" / "k8s")
+    monkeypatch.setattr(mg, "_jinja_env", None)
+    return mg._get_jinja_env()
+
+
+def test_jinja_env_is_built_once(templates_env):
+    assert mg._get_jinja_env() is templates_env
+    assert templates_env.get_template("httproute.j2") is templates_env.get_template("httproute.j2")
+
+
+def test_missing_templates_dir_raises(monkeypatch, tmp_path):
+    monkeypatch.setattr(mg, "TEMPLATES_DIR", tmp_path / "missing")
+    monkeypatch.setattr(mg, "_jinja_env", None)
+    with pytest.raises(FileNotFoundError):
+        mg._get_jinja_env()
+
+
+def test_to_yaml_filter_matches_yaml_dump(templates_env):
+    value = {"b": 1, "a": ["x", {"c": True}]}
+    assert templates_env.filters["to_yaml"](value) == yaml.dump(value, default_flow_style=False)
+
+
+def test_to_yaml_filter_accepts_non_plain_values(templates_env):
+    # The full Dumper (not the safe one) is used, as with yaml.dump's default
+    assert "PosixPath" in templates_env.filters["to_yaml"]({"path": Path("/data")})
+
+
+def test_yaml_falls_back_to_pure_python_without_libyaml(monkeypatch):
+    monkeypatch.delattr(yaml, "CSafeLoader", raising=False)
+    monkeypatch.delattr(yaml, "CDumper", raising=False)
+    try:
+        importlib.reload(mg)
+        assert mg.SafeLoader is yaml.SafeLoader
+        assert mg.Dumper is yaml.Dumper
+    finally:
+        monkeypatch.undo()
+        importlib.reload(mg)
@@ -6,10 +6,17 @@ Replaces the Ansible playbook with optimized Python code.
 
 import asyncio
 import base64
+import hashlib
 import json
 import os
+import random
+import shutil
+import ssl
 import subprocess
 import sys
+import time
+import traceback
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import partial
@@ -19,10 +26,286 @@ from typing import Any, Dict, List, Optional
 import aiohttp
 import jinja2
 import yaml
-from kubernetes_asyncio import client, config
+from kubernetes_asyncio import client, config, watch
 from kubernetes_asyncio.client.rest import ApiException
 from kubernetes_asyncio.stream import WsApiClient
 
+# Prefer the libyaml C bindings; fall back to the pure-Python implementation.
+# The to_yaml filter keeps PyYAML's full Dumper (as yaml.dump's default), only
+# C-accelerated.
+try:
+    from yaml import CSafeLoader as SafeLoader, CDumper as Dumper
+except ImportError:
+    from yaml import SafeLoader, Dumper
+
+# Prefer orjson for request bodies and the params file; fall back to stdlib json
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_dumps = json.dumps
+    _json_loads = json.loads
+
+# Direct PostgreSQL connections when asyncpg is installed; database setup falls
+# back to running psql inside the PostgreSQL pod otherwise
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+# libuv-based event loop when available (it ships with uvicorn[standard] in the
+# backend image); the stock asyncio loop is used otherwise
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Inside container the k8s templates live at /home/thinkube/thinkube-control/templates
+TEMPLATES_DIR = Path("/home/thinkube/thinkube-control/templates/k8s")
+
+# Every deploy runs in a fresh interpreter, so compiled template bytecode is
+# kept on disk between runs. Jinja checksums the template source, so an edited
+# template is recompiled; an unwritable cache dir just disables the cache.
+JINJA_BYTECODE_CACHE_DIR = Path.home() / '.cache' / 'thinkube' / 'jinja'
+try:
+    JINJA_BYTECODE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    _JINJA_BYTECODE_CACHE = jinja2.FileSystemBytecodeCache(str(JINJA_BYTECODE_CACHE_DIR))
+except OSError:
+    _JINJA_BYTECODE_CACHE = None
+
+# Shared Jinja2 environment: templates are compiled once per process and reused
+# by every render (auto_reload off - templates don't change during a deploy)
+_JINJA_ENV = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(str(TEMPLATES_DIR)),
+    undefined=jinja2.StrictUndefined,
+    lstrip_blocks=True,
+    trim_blocks=True,
+    auto_reload=False,
+    bytecode_cache=_JINJA_BYTECODE_CACHE
+)
+_JINJA_ENV.filters['to_yaml'] = lambda x: yaml.dump(x, Dumper=Dumper, default_flow_style=False)
+_JINJA_ENV.filters['to_json'] = lambda x: json.dumps(x)
+
+# Server-side apply: idempotent create-or-update in a single PATCH
+FIELD_MANAGER = 'thinkube-deployer'
+APPLY_PATCH_CONTENT_TYPE = 'application/apply-patch+yaml'
+
+# Metadata-only list responses (names/labels without spec/status)
+PARTIAL_METADATA_LIST_ACCEPT = 'application/json;as=PartialObjectMetadataList;g=meta.k8s.io;v=v1'
+
+# Server-side timeout of one workflow watch window; the watch is re-established
+# until the build finishes
+WORKFLOW_WATCH_TIMEOUT = 300
+
+# Polling fallback (watch unavailable): exponential backoff between polls,
+# reset whenever the workflow makes progress, with +/-25% jitter
+POLL_BACKOFF_INITIAL = 0.5
+POLL_BACKOFF_MAX = 5.0
+POLL_BACKOFF_FACTOR = 1.5
+
+# Frames of a failed deployment's traceback that are logged (innermost last)
+TRACEBACK_FRAME_LIMIT = 10
+
+# asyncpg connect timeout (seconds); an unreachable postgres.<domain> falls
+# back to psql in the pod quickly instead of stalling Phase 3
+POSTGRES_CONNECT_TIMEOUT = 5
+
+# One SSLContext for every HTTPS call. Cluster services use self-signed/internal
+# certificates, so verification stays disabled (as with the previous per-call
+# ssl=False), but the context is built once and TLS sessions can be reused.
+_SSL_CTX = ssl.create_default_context()
+_SSL_CTX.check_hostname = False
+_SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Secrets read from the thinkube-control namespace in Phase 2 (concurrent GETs)
+THINKUBE_CONTROL_SECRETS = ('admin-credentials', 'mlflow-auth-config', 'argocd-credentials', 'mcp-default-token')
+
+# Helper files committed to every app repo (git hook, helper scripts, docs).
+# Compiled once per process from in-memory sources; rendered per deploy.
+_HELPER_TEMPLATES = {
+    'pre-commit': r'''#!/bin/bash
+# Git pre-commit hook to regenerate k8s/ manifests when thinkube.yaml changes
+# AUTO-GENERATED - DO NOT EDIT
+
+GREEN='\033[0;32m'
+YELLOW='\033[1;33m'
+RED='\033[0;31m'
+NC='\033[0m'
+
+APP_NAME="{{ app_name }}"
+DOMAIN_NAME="{{ domain }}"
+CONTROL_URL="{{ control_url }}"
+
+# Check if thinkube.yaml has been modified in this commit
+if ! git diff --cached --name-only | grep -q '^thinkube\.yaml$'; then
+    exit 0
+fi
+
+echo -e "${YELLOW}Pre-commit hook: thinkube.yaml changed, regenerating k8s/ manifests...${NC}"
+
+# Get auth token
+TOKEN_FILE="$HOME/.thinkube/api-token"
+if [ -f "$TOKEN_FILE" ]; then
+    API_TOKEN=$(cat "$TOKEN_FILE")
+else
+    API_TOKEN="${THINKUBE_API_TOKEN:-}"
+fi
+
+if [ -z "$API_TOKEN" ]; then
+    echo -e "${RED}ERROR: No API token found.${NC}"
+    echo "Set THINKUBE_API_TOKEN or create $TOKEN_FILE"
+    echo "You can generate an API token at ${CONTROL_URL}/api-tokens"
+    exit 1
+fi
+
+# Call thinkube-control API to regenerate manifests
+RESPONSE=$(curl -s -w "\n%{http_code}" \
+    -X POST \
+    -H "Authorization: Bearer ${API_TOKEN}" \
+    -H "Content-Type: application/json" \
+    "${CONTROL_URL}/api/v1/templates/apps/${APP_NAME}/regenerate-manifests" \
+    2>&1)
+
+HTTP_CODE=$(echo "$RESPONSE" | tail -1)
+BODY=$(echo "$RESPONSE" | sed '$d')
+
+if [ "$HTTP_CODE" != "200" ]; then
+    echo -e "${RED}ERROR: Failed to regenerate manifests (HTTP ${HTTP_CODE})${NC}"
+    echo "$BODY"
+    echo ""
+    echo "You can still commit without manifest regeneration by using:"
+    echo "  git commit --no-verify"
+    exit 1
+fi
+
+# Stage the regenerated k8s/ files
+if [ -d "k8s" ]; then
+    git add k8s/
+    echo -e "${GREEN}k8s/ manifests regenerated and staged for commit.${NC}"
+fi
+
+exit 0
+''',
+    'install-hooks.sh': r'''#!/bin/bash
+# Reinstall git hooks if needed
+echo "Installing git hooks..."
+mkdir -p .git/hooks
+cp .git-hooks/pre-commit .git/hooks/pre-commit
+chmod +x .git/hooks/pre-commit
+echo "Git hooks installed!"
+echo "When you modify thinkube.yaml and commit, k8s/ manifests are automatically regenerated."
+''',
+    'regenerate-manifests.sh': r'''#!/bin/bash
+# Manually regenerate k8s/ manifests from thinkube.yaml
+# AUTO-GENERATED - DO NOT EDIT
+
+APP_NAME="{{ app_name }}"
+DOMAIN_NAME="{{ domain }}"
+CONTROL_URL="{{ control_url }}"
+
+TOKEN_FILE="$HOME/.thinkube/api-token"
+if [ -f "$TOKEN_FILE" ]; then
+    API_TOKEN=$(cat "$TOKEN_FILE")
+else
+    API_TOKEN="${THINKUBE_API_TOKEN:-}"
+fi
+
+if [ -z "$API_TOKEN" ]; then
+    echo "ERROR: No API token found."
+    echo "Set THINKUBE_API_TOKEN or create $TOKEN_FILE"
+    exit 1
+fi
+
+echo "Regenerating k8s/ manifests for ${APP_NAME}..."
+
+RESPONSE=$(curl -s -w "\n%{http_code}" \
+    -X POST \
+    -H "Authorization: Bearer ${API_TOKEN}" \
+    -H "Content-Type: application/json" \
+    "${CONTROL_URL}/api/v1/templates/apps/${APP_NAME}/regenerate-manifests")
+
+HTTP_CODE=$(echo "$RESPONSE" | tail -1)
+BODY=$(echo "$RESPONSE" | sed '$d')
+
+if [ "$HTTP_CODE" = "200" ]; then
+    echo "Manifests regenerated successfully."
+    echo "$BODY" | python3 -c "import sys,json; d=json.load(sys.stdin); print(f\"Files: {', '.join(d['files_generated'])}\")" 2>/dev/null || true
+else
+    echo "ERROR: Failed (HTTP ${HTTP_CODE})"
+    echo "$BODY"
+    exit 1
+fi
+''',
+    'DEVELOPMENT.md': r'''# Development Workflow
+
+This repository is hosted on Gitea for local development with Thinkube.
+
+## Making Changes
+
+Edit your code and commit as normal:
+```bash
+git add .
+git commit -m "Your changes"
+git push
+```
+
+Pushing to Gitea triggers a build and deploy automatically.
+
+## Changing App Configuration
+
+If you modify `thinkube.yaml` (add containers, change routes, add services):
+
+1. Edit `thinkube.yaml`
+2. Commit — the pre-commit hook automatically regenerates `k8s/` manifests
+3. Push — the build picks up the new configuration
+
+To manually regenerate manifests without committing:
+```bash
+./regenerate-manifests.sh
+```
+
+## Publishing as a Template
+
+To share your app as a reusable template, use the "Publish as Template"
+feature in the Thinkube Control UI. Your code is already template-ready —
+no transformation needed.
+''',
+}
+
+_HELPER_ENV = jinja2.Environment(
+    loader=jinja2.DictLoader(_HELPER_TEMPLATES),
+    undefined=jinja2.StrictUndefined,
+    keep_trailing_newline=True,
+    autoescape=False,
+    auto_reload=False,
+    cache_size=-1
+)
+
+
+def _write_file(path: Path, content: str, mode: Optional[int] = None):
+    """Write a text file in one call and optionally set its mode bits."""
+    path.write_text(content)
+    if mode is not None:
+        path.chmod(mode)
+
+
+async def gather_with_concurrency(n: int, *coros, return_exceptions: bool = False):
+    """asyncio.gather with at most `n` of the coroutines running at once."""
+    semaphore = asyncio.Semaphore(n)
+
+    async def sem_coro(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(
+        *(sem_coro(c) for c in coros),
+        return_exceptions=return_exceptions
+    )
+
 
 class DeploymentLogger:
     """Handles real-time logging with timestamps."""
@@ -30,10 +313,21 @@ class DeploymentLogger:
     # Set to True to enable debug logging
     DEBUG = os.environ.get('DEPLOYMENT_DEBUG', 'false').lower() == 'true'
 
+    # HH:MM:SS prefix for the current wall-clock second, reused across calls
+    _ts_second = -1
+    _ts_prefix = ''
+
     @staticmethod
     def log(message: str, level: str = "INFO"):
-        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
-        print(f"[{timestamp}] [{level}] {message}", flush=True)
+        now = time.time()
+        second = int(now)
+        if second != DeploymentLogger._ts_second:
+            lt = time.localtime(second)
+            DeploymentLogger._ts_prefix = f"{lt.tm_hour:02d}:{lt.tm_min:02d}:{lt.tm_sec:02d}"
+            DeploymentLogger._ts_second = second
+        ms = int((now - second) * 1000)
+        sys.stdout.write(f"[{DeploymentLogger._ts_prefix}.{ms:03d}] [{level}] {message}\n")
+        sys.stdout.flush()
 
     @staticmethod
     def debug(message: str):
@@ -76,24 +370,92 @@ class ApplicationDeployer:
         # Will be populated during deployment
         self.secrets = {}
         self.thinkube_config = {}
+        self._api_client = None
         self.k8s_core = None
         self.k8s_custom = None
+        # Upper bound on concurrent API calls fanned out by a single phase;
+        # writes (Phase 3) get a tighter bound than reads to stay clear of
+        # apiserver priority-and-fairness throttling
+        self._max_concurrency = int(params.get('max_concurrency') or 8)
+        self._max_write_concurrency = int(params.get('max_write_concurrency') or 4)
+
+        # Deploy-state gating: hash of the Phase 3 inputs, compared with the
+        # hash stored by the previous successful deployment
+        self._thinkube_yaml_raw = ''
+        self._state_hash = None
+        self._state_unchanged = False
+
+        # Shared aiohttp session/connector: keep-alive and one DNS cache for
+        # the auth./git./control. hosts across the whole deploy
+        self._http = None
+        self._http_connector = None
+
+        # Long-latency HTTP work started early and awaited by later phases
+        self._kc_task = None
+        self._gitea_task = None
+
+        # Decoded gitea-webhook-secret (argo namespace), read on first use
+        self._webhook_secret = None
+
+        # Decoded mcp-default-token (thinkube-control namespace), read on first use
+        self._mcp_token = None
+
+        # resourceVersion of the pre-push workflow snapshot; the trigger watch
+        # starts there so existing workflows are not replayed as ADDED events
+        self._workflows_rv = None
+        # Last reported phase per workflow node id, and how many transitions were logged
+        self._node_phase: Dict[str, str] = {}
+        self._node_transitions = 0
+
+        # Keycloak admin token cache: (access_token, monotonic expiry)
+        self._kc_token = None
 
     async def initialize_k8s_clients(self):
         """Initialize Kubernetes async clients."""
-        await config.load_kube_config(config_file=self.params.get('kubeconfig'))
-        self.k8s_core = client.CoreV1Api()
-        self.k8s_custom = client.CustomObjectsApi()
-        self.k8s_apps = client.AppsV1Api()
+        k8s_config = client.Configuration()
+        await config.load_kube_config(
+            config_file=self.params.get('kubeconfig'),
+            client_configuration=k8s_config
+        )
+        # Size the aiohttp pool for the phase fan-out so gathered calls never
+        # queue behind an exhausted connection pool
+        k8s_config.connection_pool_maxsize = max(
+            k8s_config.connection_pool_maxsize or 0, self._max_concurrency * 2
+        )
+        # One ApiClient (one aiohttp connection pool) shared by all API groups
+        self._api_client = client.ApiClient(k8s_config)
+        self.k8s_core = client.CoreV1Api(self._api_client)
+        self.k8s_custom = client.CustomObjectsApi(self._api_client)
+        self.k8s_apps = client.AppsV1Api(self._api_client)
+
+    def _http_session(self) -> aiohttp.ClientSession:
+        """Return the deployment's shared ClientSession (created on first use).
+
+        One session for every HTTPS call in a deploy keeps connections to
+        git.<domain>, auth.<domain> and control.<domain> alive between calls
+        and resolves each hostname once per run. Closed in deploy()'s finally.
+        """
+        if self._http is None or self._http.closed:
+            # keepalive_timeout outlives the gaps between phases (e.g. Gitea repo
+            # creation in Phase 2 -> webhook in Phase 4) so connections are reused
+            self._http_connector = aiohttp.TCPConnector(
+                ssl=_SSL_CTX, limit=self._max_concurrency * 4, keepalive_timeout=75,
+                use_dns_cache=True, ttl_dns_cache=600, enable_cleanup_closed=True
+            )
+            self._http = aiohttp.ClientSession(connector=self._http_connector, json_serialize=_json_dumps)
+        return self._http
 
     async def cleanup_k8s_clients(self):
-        """Close K8s client connections."""
-        if self.k8s_core:
-            await self.k8s_core.api_client.close()
-        if self.k8s_custom:
-            await self.k8s_custom.api_client.close()
-        if self.k8s_apps:
-            await self.k8s_apps.api_client.close()
+        """Close K8s client connections and the shared HTTP session.
+
+        The apiserver pool stays separate from the HTTP session: it is built
+        by kubernetes_asyncio with the kubeconfig CA/client-cert SSL context,
+        which must not be applied to Gitea/Keycloak/control-plane requests.
+        """
+        if self._api_client:
+            await self._api_client.close()
+        if self._http is not None:
+            await self._http.close()
 
     # ==================== PHASE 1: Setup & Validation ====================
 
@@ -144,15 +506,13 @@ class ApplicationDeployer:
             return
 
         DeploymentLogger.log("Pulling latest changes from Gitea repository")
-        gitea_token = self._decode_secret_data(self.secrets['gitea'], 'token')
+        gitea_token = self.secrets['gitea_plain'].get('token')
         gitea_hostname = f"git.{self.domain}"
         org = "thinkube-deployments"
 
         pull_script = f"""
 set -e
 cd {self.local_repo_path}
-git config user.name '{self.admin_username}'
-git config user.email '{self.admin_username}@{self.domain}'
 git remote set-url origin 'https://{self.admin_username}:{gitea_token}@{gitea_hostname}/{org}/{self.gitea_repo_name}.git' || \
 git remote add origin 'https://{self.admin_username}:{gitea_token}@{gitea_hostname}/{org}/{self.gitea_repo_name}.git'
 # Fetch and reset to match remote exactly (discard any local changes)
@@ -169,40 +529,47 @@ git reset --hard origin/main
             DeploymentLogger.log("Successfully pulled latest changes")
 
     async def create_namespace(self):
-        """Create application namespace if it doesn't exist."""
-        try:
-            await self.k8s_core.read_namespace(self.namespace)
-            DeploymentLogger.log(f"Namespace {self.namespace} already exists")
-        except ApiException as e:
-            if e.status == 404:
-                namespace = client.V1Namespace(
-                    metadata=client.V1ObjectMeta(name=self.namespace)
-                )
-                try:
-                    await self.k8s_core.create_namespace(namespace)
-                    DeploymentLogger.success(f"Created namespace {self.namespace}")
-                except ApiException as create_e:
-                    # Handle race condition - namespace may have been created between read and create
-                    if create_e.status == 409:
-                        DeploymentLogger.log(f"Namespace {self.namespace} already exists (race condition)")
-                    else:
-                        raise
-            else:
-                raise
+        """Create application namespace if it doesn't exist.
 
-    def _run_copier_sync(self, copier_cmd: list, cwd: str) -> tuple:
-        """Synchronous Copier execution (runs in thread pool to avoid blocking event loop)."""
-        result = subprocess.run(
-            copier_cmd,
-            capture_output=True,
-            text=True,
-            cwd=cwd,
-            timeout=300  # 5 minute timeout for Copier
+        Server-side apply: one idempotent PATCH instead of read-then-create
+        (and the 409 race between them).
+        """
+        await self.k8s_core.patch_namespace(
+            self.namespace,
+            {'apiVersion': 'v1', 'kind': 'Namespace', 'metadata': {'name': self.namespace}},
+            field_manager=FIELD_MANAGER,
+            force=True,
+            _content_type=APPLY_PATCH_CONTENT_TYPE
         )
-        return result.returncode, result.stdout, result.stderr
+        DeploymentLogger.log(f"Namespace {self.namespace} ready")
+
+    @staticmethod
+    async def _pump_stream(stream: asyncio.StreamReader, level: str, tail: Optional[deque] = None):
+        """Log a subprocess stream line by line as it is produced.
+
+        Keeps the OS pipe drained so large outputs never block the child, and
+        optionally retains the last few lines in `tail` for error reporting.
+        A line longer than the stream limit (e.g. a huge SQLAlchemy warning) is
+        discarded by readline(); it is reported as truncated and pumping goes
+        on, so the child is never left writing into a full pipe.
+        """
+        while True:
+            try:
+                line = await stream.readline()
+            except ValueError:
+                DeploymentLogger.log("[output line exceeded buffer limit, truncated]", level)
+                continue
+            if not line:
+                break
+            text = line.decode(errors='replace').rstrip()
+            if not text:
+                continue
+            DeploymentLogger.log(text, level)
+            if tail is not None:
+                tail.append(text)
 
     async def run_copier(self):
-        """Run Copier to process the template (in thread pool to keep event loop responsive)."""
+        """Run Copier to process the template (async subprocess keeps the event loop responsive)."""
         DeploymentLogger.log(f"Processing template: {self.template_url}")
 
         # Ensure apps/ directory exists
@@ -231,18 +598,33 @@ git reset --hard origin/main
             if key not in ['app_name', 'template_url', 'deployment_namespace', 'domain_name', 'admin_username']:
                 copier_cmd.extend(["--data", f"{key}={value}"])
 
-        # Run copier in thread pool to avoid blocking the event loop
-        # This ensures health checks can still respond during long Copier runs
-        loop = asyncio.get_event_loop()
+        # Run copier as an async subprocess and stream its output as it runs,
+        # so the event loop stays responsive and output is never buffered whole
         cwd = str(Path(self.local_repo_path).parent)
-
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            returncode, stdout, stderr = await loop.run_in_executor(
-                executor,
-                partial(self._run_copier_sync, copier_cmd, cwd)
+        process = await asyncio.create_subprocess_exec(
+            *copier_cmd,
+            cwd=cwd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr_tail = deque(maxlen=20)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    self._pump_stream(process.stdout, "COPIER"),
+                    self._pump_stream(process.stderr, "COPIER", stderr_tail),
+                    process.wait()
+                ),
+                timeout=300  # 5 minute timeout for Copier
             )
-
-        if returncode != 0:
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            DeploymentLogger.error("Copier timed out after 300s")
+            raise RuntimeError("Copier execution timed out")
+
+        if process.returncode != 0:
+            stderr = "\n".join(stderr_tail)
             DeploymentLogger.error(f"Copier failed: {stderr}")
             raise RuntimeError("Copier execution failed")
 
@@ -260,18 +642,25 @@ git reset --hard origin/main
         """Phase 2: Fetch all required resources in parallel."""
         DeploymentLogger.phase(2, "Resource Gathering (Parallel)")
 
-        # Run all fetch operations concurrently (except those with dependencies)
-        results = await asyncio.gather(
+        # The Gitea token was loaded in Phase 1B, so the repository can be
+        # ensured now, overlapping with everything up to Phase 4
+        self._gitea_task = asyncio.create_task(self.ensure_gitea_repo(), name='ensure-gitea-repo')
+
+        # Run all fetch operations concurrently (except those with dependencies).
+        # The thinkube-control secrets are read with concurrent GETs; the Gitea token
+        # is only re-read if Phase 1B didn't load it. The webhook secret is
+        # read here too so Phase 4's configure_webhook finds it cached.
+        fetches = [
             self.get_wildcard_cert(),
             self.get_harbor_credentials(),
-            self.get_admin_credentials(),
-            self.get_mlflow_credentials(),
+            self._get_control_secrets_and_start_keycloak(),
             self.get_seaweedfs_credentials(),
-            self.get_argocd_credentials(),
-            self.get_gitea_token(),
             self.parse_thinkube_yaml(),
-            return_exceptions=True
-        )
+            self._get_webhook_secret(),
+        ]
+        if not self.secrets.get('gitea'):
+            fetches.append(self.get_gitea_token())
+        results = await gather_with_concurrency(self._max_concurrency, *fetches, return_exceptions=True)
 
         # Check for any failures
         for i, result in enumerate(results):
@@ -279,8 +668,61 @@ git reset --hard origin/main
                 DeploymentLogger.error(f"Resource gathering failed: {result}")
                 raise result
 
+        self._state_hash = self._compute_state_hash()
+        self._state_unchanged = await self._deploy_state_matches(self._state_hash)
+        if self._state_unchanged:
+            DeploymentLogger.log("Inputs unchanged since last deployment - Phase 3 will skip secrets and database")
+
         DeploymentLogger.success("Phase 2 complete - all resources gathered")
 
+    def _compute_state_hash(self) -> str:
+        """Hash the inputs that determine Phase 3's secrets and database state.
+
+        Covers every deployment parameter (except the per-run deployment_id),
+        the raw thinkube.yaml and the resourceVersion of every source secret
+        Phase 3 copies, so a changed parameter or an upstream rotation
+        invalidates the hash.
+        """
+        params = {k: v for k, v in self.params.items() if k != 'deployment_id'}
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        h.update(b"\0")
+        h.update(self._thinkube_yaml_raw.encode())
+        for secret in (
+            self.secrets['admin'],
+            self.secrets['wildcard_cert'],
+            self.secrets['harbor'],
+            self.secrets['mlflow']['secret'],
+        ):
+            h.update(f"\0{secret.metadata.resource_version}".encode())
+        return h.hexdigest()
+
+    async def _deploy_state_matches(self, state_hash: str) -> bool:
+        """Check the hash stored in the {app}-deploy-state ConfigMap."""
+        try:
+            cm = await self.k8s_core.read_namespaced_config_map(f'{self.app_name}-deploy-state', self.namespace)
+        except ApiException as e:
+            if e.status == 404:
+                return False
+            raise
+        return (cm.data or {}).get('state_hash') == state_hash
+
+    async def _save_deploy_state(self):
+        """Record the current input hash (server-side apply)."""
+        name = f'{self.app_name}-deploy-state'
+        await self.k8s_core.patch_namespaced_config_map(
+            name, self.namespace,
+            {
+                'apiVersion': 'v1',
+                'kind': 'ConfigMap',
+                'metadata': {'name': name, 'namespace': self.namespace},
+                'data': {'state_hash': self._state_hash}
+            },
+            field_manager=FIELD_MANAGER,
+            force=True,
+            _content_type=APPLY_PATCH_CONTENT_TYPE
+        )
+
     async def get_wildcard_cert(self):
         """Fetch wildcard TLS certificate."""
         cert_name = self.domain.replace('.', '-') + '-tls'
@@ -299,62 +741,97 @@ git reset --hard origin/main
             return base64.b64decode(encoded).decode('utf-8')
         return None
 
+    @staticmethod
+    def _materialize_secret(secret) -> Dict[str, str]:
+        """Decode every key of a secret once, so later lookups are plain dict reads."""
+        return {
+            k: base64.b64decode(v).decode('utf-8')
+            for k, v in (secret.data or {}).items() if v
+        }
+
     async def get_harbor_credentials(self):
         """Fetch Harbor robot credentials."""
         try:
             secret = await self.k8s_core.read_namespaced_secret('harbor-robot-credentials', 'kube-system')
             self.secrets['harbor'] = secret
+            self.secrets['harbor_plain'] = self._materialize_secret(secret)
             DeploymentLogger.log("Retrieved Harbor credentials")
         except ApiException as e:
             DeploymentLogger.error(f"Failed to get Harbor credentials: {e}")
             raise
 
-    async def get_admin_credentials(self):
-        """Fetch admin credentials."""
-        try:
-            secret = await self.k8s_core.read_namespaced_secret('admin-credentials', 'thinkube-control')
-            self.secrets['admin'] = secret
-            DeploymentLogger.log("Retrieved admin credentials")
-        except ApiException as e:
-            DeploymentLogger.error(f"Failed to get admin credentials: {e}")
-            raise
+    async def _read_secrets(self, namespace: str, names: tuple) -> Dict[str, Any]:
+        """Read several secrets of one namespace with concurrent targeted GETs.
 
-    async def get_mlflow_credentials(self):
-        """Fetch MLflow credentials."""
-        try:
-            # mlflow-auth-config is a secret containing username, password, client-id, client-secret, keycloak-token-url
-            secret = await self.k8s_core.read_namespaced_secret('mlflow-auth-config', 'thinkube-control')
-            self.secrets['mlflow'] = {'secret': secret}
-            DeploymentLogger.log("Retrieved MLflow credentials")
-        except ApiException as e:
-            DeploymentLogger.error(f"Failed to get MLflow credentials: {e}")
-            raise
+        Only the named secrets are fetched, so the deployer never needs list
+        access to (or holds) the namespace's other secrets. Missing secrets are
+        simply absent from the result.
+        """
+        async def read(name):
+            try:
+                return await self.k8s_core.read_namespaced_secret(name, namespace)
+            except ApiException as e:
+                if e.status == 404:
+                    return None
+                raise
+
+        found = await asyncio.gather(*(read(name) for name in names))
+        return {name: secret for name, secret in zip(names, found) if secret is not None}
+
+    async def get_thinkube_control_secrets(self):
+        """Fetch admin, MLflow and ArgoCD credentials (and the MCP token) concurrently."""
+        found = await self._read_secrets('thinkube-control', THINKUBE_CONTROL_SECRETS)
+        for name in ('admin-credentials', 'mlflow-auth-config', 'argocd-credentials'):
+            if name not in found:
+                DeploymentLogger.error(f"Failed to get {name} from thinkube-control namespace")
+                raise RuntimeError(f"Secret thinkube-control/{name} not found")
+
+        secret = found['admin-credentials']
+        self.secrets['admin'] = secret
+        self.secrets['admin_plain'] = self._materialize_secret(secret)
+        DeploymentLogger.log("Retrieved admin credentials")
+
+        # mlflow-auth-config is a secret containing username, password, client-id, client-secret, keycloak-token-url
+        secret = found['mlflow-auth-config']
+        self.secrets['mlflow'] = {'secret': secret}
+        self.secrets['mlflow_plain'] = self._materialize_secret(secret)
+        DeploymentLogger.log("Retrieved MLflow credentials")
+
+        secret = found['argocd-credentials']
+        self.secrets['argocd'] = secret
+        self.secrets['argocd_plain'] = self._materialize_secret(secret)
+        DeploymentLogger.log("Retrieved ArgoCD credentials")
+
+        # Optional here; Phase 4/5 read it through _get_mcp_token()
+        if 'mcp-default-token' in found:
+            self._mcp_token = self._decode_secret_data(found['mcp-default-token'], 'token')
+
+    async def _get_control_secrets_and_start_keycloak(self):
+        """Fetch the thinkube-control secrets, then start the Keycloak client setup right away.
+
+        The Keycloak calls only need the admin secret, so they run in the
+        background from here and Phase 3 just awaits the task.
+        """
+        await self.get_thinkube_control_secrets()
+        self._kc_task = asyncio.create_task(self.create_keycloak_client(), name='create-keycloak-client')
 
     async def get_seaweedfs_credentials(self):
         """Fetch SeaweedFS credentials."""
         try:
             secret = await self.k8s_core.read_namespaced_secret('seaweedfs-s3-credentials', 'seaweedfs')
             self.secrets['seaweedfs'] = secret
+            self.secrets['seaweedfs_plain'] = self._materialize_secret(secret)
             DeploymentLogger.log("Retrieved SeaweedFS credentials")
         except ApiException as e:
             DeploymentLogger.error(f"Failed to get SeaweedFS credentials: {e}")
             raise
 
-    async def get_argocd_credentials(self):
-        """Fetch ArgoCD credentials."""
-        try:
-            secret = await self.k8s_core.read_namespaced_secret('argocd-credentials', 'thinkube-control')
-            self.secrets['argocd'] = secret
-            DeploymentLogger.log("Retrieved ArgoCD credentials")
-        except ApiException as e:
-            DeploymentLogger.error(f"Failed to get ArgoCD credentials: {e}")
-            raise
-
     async def get_gitea_token(self):
         """Fetch Gitea admin token."""
         try:
             secret = await self.k8s_core.read_namespaced_secret('gitea-admin-token', 'gitea')
             self.secrets['gitea'] = secret
+            self.secrets['gitea_plain'] = self._materialize_secret(secret)
             DeploymentLogger.log("Retrieved Gitea admin token")
         except ApiException as e:
             DeploymentLogger.error(f"Failed to get Gitea token: {e}")
@@ -366,8 +843,10 @@ git reset --hard origin/main
 
         config_path = Path(self.local_repo_path) / "thinkube.yaml"
         try:
-            with open(config_path, 'r') as f:
-                self.thinkube_config = yaml.safe_load(f)
+            # Read and parse off the event loop so the rest of the gather wave keeps running
+            content = await asyncio.to_thread(config_path.read_text)
+            self._thinkube_yaml_raw = content
+            self.thinkube_config = await asyncio.to_thread(yaml.load, content, Loader=SafeLoader)
             # Inject metadata.name from deploy-time app name
             # thinkube.yaml doesn't contain the name — the platform provides it
             if 'metadata' not in self.thinkube_config:
@@ -410,50 +889,50 @@ git reset --hard origin/main
         import threading
         thread_id = threading.get_ident()
         DeploymentLogger.debug(f" ensure_gitea_repo() called for {self.gitea_repo_name} (PID={pid}, thread={thread_id})")
-        gitea_token = self._decode_secret_data(self.secrets['gitea'], 'token')
+        gitea_token = self.secrets['gitea_plain'].get('token')
         gitea_hostname = f"git.{self.domain}"
         org = "thinkube-deployments"
 
-        # Use TCPConnector with limit=1 to prevent connection pooling race conditions
-        connector = aiohttp.TCPConnector(limit=1, limit_per_host=1)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            headers = {
-                'Authorization': f'token {gitea_token}',
-                'Content-Type': 'application/json'
-            }
+        # The GET and POST below are strictly sequential, so they share the
+        # deployment session (and its keep-alive connection to git.<domain>)
+        session = self._http_session()
+        headers = {
+            'Authorization': f'token {gitea_token}',
+            'Content-Type': 'application/json'
+        }
 
-            # Check if repo already exists - if so, just reuse it (truly synchronous)
-            check_url = f"https://{gitea_hostname}/api/v1/repos/{org}/{self.gitea_repo_name}"
-            DeploymentLogger.debug(f" Checking if repo exists: {check_url}")
-            async with session.get(check_url, headers=headers, ssl=False) as check_resp:
-                DeploymentLogger.debug(f" Repo check status: {check_resp.status}")
-                if check_resp.status == 200:
-                    repo_data = await check_resp.json()
-                    DeploymentLogger.log(f"Repository already exists, reusing it")
-                    repo_url = repo_data['clone_url']
-                    DeploymentLogger.log(f"Gitea repo ready: {repo_url}")
-                    return repo_url
-
-            # Create new repository with unique name
-            create_url = f"https://{gitea_hostname}/api/v1/orgs/{org}/repos"
-            repo_payload = {
-                'name': self.gitea_repo_name,
-                'description': f'Deployment manifests for {self.app_name} (deployment {self.deployment_id})',
-                'private': True,
-                'auto_init': False
-            }
+        # Check if repo already exists - if so, just reuse it (truly synchronous)
+        check_url = f"https://{gitea_hostname}/api/v1/repos/{org}/{self.gitea_repo_name}"
+        DeploymentLogger.debug(f" Checking if repo exists: {check_url}")
+        async with session.get(check_url, headers=headers) as check_resp:
+            DeploymentLogger.debug(f" Repo check status: {check_resp.status}")
+            if check_resp.status == 200:
+                repo_data = await check_resp.json()
+                DeploymentLogger.log(f"Repository already exists, reusing it")
+                repo_url = repo_data['clone_url']
+                DeploymentLogger.log(f"Gitea repo ready: {repo_url}")
+                return repo_url
+
+        # Create new repository with unique name
+        create_url = f"https://{gitea_hostname}/api/v1/orgs/{org}/repos"
+        repo_payload = {
+            'name': self.gitea_repo_name,
+            'description': f'Deployment manifests for {self.app_name} (deployment {self.deployment_id})',
+            'private': True,
+            'auto_init': False
+        }
 
-            DeploymentLogger.debug(f" About to send POST request to create repo")
-            async with session.post(create_url, headers=headers, json=repo_payload, ssl=False) as resp:
-                DeploymentLogger.debug(f" POST request completed with status: {resp.status}")
-                if resp.status == 201:
-                    DeploymentLogger.log(f"Created Gitea repository: {org}/{self.gitea_repo_name}")
-                    DeploymentLogger.debug(" ensure_gitea_repo() exiting normally")
-                else:
-                    error_text = await resp.text()
-                    DeploymentLogger.error(f"Failed to create Gitea repo: {resp.status} - {error_text}")
-                    DeploymentLogger.debug(f" This should be impossible with UUID: {self.deployment_id}")
-                    raise RuntimeError(f"Failed to create Gitea repository: {resp.status}")
+        DeploymentLogger.debug(f" About to send POST request to create repo")
+        async with session.post(create_url, headers=headers, json=repo_payload) as resp:
+            DeploymentLogger.debug(f" POST request completed with status: {resp.status}")
+            if resp.status == 201:
+                DeploymentLogger.log(f"Created Gitea repository: {org}/{self.gitea_repo_name}")
+                DeploymentLogger.debug(" ensure_gitea_repo() exiting normally")
+            else:
+                error_text = await resp.text()
+                DeploymentLogger.error(f"Failed to create Gitea repo: {resp.status} - {error_text}")
+                DeploymentLogger.debug(f" This should be impossible with UUID: {self.deployment_id}")
+                raise RuntimeError(f"Failed to create Gitea repository: {resp.status}")
 
     # ==================== PHASE 3: Resource Creation ====================
 
@@ -461,37 +940,51 @@ git reset --hard origin/main
         """Phase 3: Create all K8s resources in parallel."""
         DeploymentLogger.phase(3, "Resource Creation (Parallel)")
 
-        # Create all resources concurrently
-        await asyncio.gather(
-            self.create_tls_secret(),
-            self.create_harbor_secret(),
-            self.create_mlflow_config(),
-            self.create_app_metadata(),
-            self.manage_databases(),
-            self.create_keycloak_client(),
+        # Workflow template is always applied: it also depends on the cluster
+        # architectures and the build-workflow.j2 shipped with thinkube-control
+        tasks = [
+            self._kc_task,  # started in Phase 2 once admin credentials arrived
             self.deploy_workflow_template(),
-            return_exceptions=False
-        )
+        ]
+        if self._state_unchanged:
+            DeploymentLogger.log("Skipping secrets, app metadata and database - inputs unchanged")
+        else:
+            tasks += [
+                self.create_tls_secret(),
+                self.create_harbor_secret(),
+                self.create_mlflow_config(),
+                self.create_app_metadata(),
+                self.manage_databases(),
+            ]
+
+        # Create all resources concurrently (bounded)
+        await gather_with_concurrency(self._max_write_concurrency, *tasks, return_exceptions=False)
+
+        if not self._state_unchanged:
+            await self._save_deploy_state()
 
         DeploymentLogger.success("Phase 3 complete - all resources created")
 
+    async def _apply_secret(self, body: dict):
+        """Create or update a secret in one call via server-side apply."""
+        name = body['metadata']['name']
+        namespace = body['metadata']['namespace']
+        await self.k8s_core.patch_namespaced_secret(
+            name, namespace, {'apiVersion': 'v1', 'kind': 'Secret', **body},
+            field_manager=FIELD_MANAGER,
+            force=True,
+            _content_type=APPLY_PATCH_CONTENT_TYPE
+        )
+        DeploymentLogger.log(f"Applied secret {name} in {namespace}")
+
     async def create_tls_secret(self):
         """Copy TLS certificate to application namespace (name: {namespace}-tls-secret to match Ansible)."""
         cert = self.secrets['wildcard_cert']
-        tls_secret_name = f"{self.namespace}-tls-secret"
-        new_secret = client.V1Secret(
-            metadata=client.V1ObjectMeta(name=tls_secret_name, namespace=self.namespace),
-            data=cert.data,
-            type=cert.type
-        )
-        try:
-            await self.k8s_core.create_namespaced_secret(self.namespace, new_secret)
-            DeploymentLogger.log(f"Created TLS secret: {tls_secret_name}")
-        except ApiException as e:
-            if e.status == 409:
-                DeploymentLogger.log(f"TLS secret {tls_secret_name} already exists")
-            else:
-                raise
+        await self._apply_secret({
+            'metadata': {'name': f"{self.namespace}-tls-secret", 'namespace': self.namespace},
+            'data': cert.data,
+            'type': cert.type
+        })
 
     async def create_harbor_secret(self):
         """Create Harbor secrets for Kaniko (argo) and pod pulls (app namespace).
@@ -500,9 +993,9 @@ git reset --hard origin/main
         - harbor-docker-config in argo namespace (type Opaque, key config.json) for Kaniko builds
         - app-pull-secret in app namespace (type kubernetes.io/dockerconfigjson) for pod image pulls
         """
-        harbor = self.secrets['harbor']
-        harbor_user = self._decode_secret_data(harbor, 'robot-user')
-        harbor_token = self._decode_secret_data(harbor, 'robot-token')
+        harbor = self.secrets['harbor_plain']
+        harbor_user = harbor.get('robot-user')
+        harbor_token = harbor.get('robot-token')
         container_registry = f"registry.{self.domain}"
 
         # Build the docker config JSON - matches Ansible (auth field only, no separate username/password)
@@ -516,139 +1009,137 @@ git reset --hard origin/main
         docker_config_json = json.dumps(docker_config)
         docker_config_b64 = base64.b64encode(docker_config_json.encode()).decode()
 
-        # 1. Create harbor-docker-config in argo namespace for Kaniko (type Opaque, key config.json)
-        kaniko_secret = client.V1Secret(
-            metadata=client.V1ObjectMeta(name='harbor-docker-config', namespace='argo'),
-            data={'config.json': docker_config_b64},
-            type='Opaque'
-        )
-        try:
-            await self.k8s_core.create_namespaced_secret('argo', kaniko_secret)
-            DeploymentLogger.log("Created harbor-docker-config in argo namespace")
-        except ApiException as e:
-            if e.status == 409:
-                DeploymentLogger.log("harbor-docker-config already exists in argo")
-            else:
-                raise
-
-        # 2. Create app-pull-secret in app namespace for pod pulls (type dockerconfigjson)
-        pull_secret = client.V1Secret(
-            metadata=client.V1ObjectMeta(name='app-pull-secret', namespace=self.namespace),
-            data={'.dockerconfigjson': docker_config_b64},
-            type='kubernetes.io/dockerconfigjson'
+        # The two namespaces are independent - apply both concurrently
+        await asyncio.gather(
+            # 1. harbor-docker-config in argo namespace for Kaniko (type Opaque, key config.json)
+            self._apply_secret({
+                'metadata': {'name': 'harbor-docker-config', 'namespace': 'argo'},
+                'data': {'config.json': docker_config_b64},
+                'type': 'Opaque'
+            }),
+            # 2. app-pull-secret in app namespace for pod pulls (type dockerconfigjson)
+            self._apply_secret({
+                'metadata': {'name': 'app-pull-secret', 'namespace': self.namespace},
+                'data': {'.dockerconfigjson': docker_config_b64},
+                'type': 'kubernetes.io/dockerconfigjson'
+            }),
         )
-        try:
-            await self.k8s_core.create_namespaced_secret(self.namespace, pull_secret)
-            DeploymentLogger.log(f"Created app-pull-secret in {self.namespace}")
-        except ApiException as e:
-            if e.status == 409:
-                DeploymentLogger.log(f"app-pull-secret already exists in {self.namespace}")
-            else:
-                raise
 
     async def create_mlflow_config(self):
         """Create MLflow configuration secret in target namespace."""
         mlflow_secret = self.secrets['mlflow']['secret']
-        # Copy the secret data to the target namespace
-        new_secret = client.V1Secret(
-            metadata=client.V1ObjectMeta(name='mlflow-auth-config', namespace=self.namespace),
-            data=mlflow_secret.data  # Already base64 encoded
-        )
-        try:
-            await self.k8s_core.create_namespaced_secret(self.namespace, new_secret)
-            DeploymentLogger.log("Created MLflow config secret")
-        except ApiException as e:
-            if e.status == 409:
-                # Update existing secret with fresh credentials
-                await self.k8s_core.replace_namespaced_secret('mlflow-auth-config', self.namespace, new_secret)
-                DeploymentLogger.log("Updated MLflow config secret")
+        # Copy the secret data to the target namespace (apply refreshes existing credentials)
+        await self._apply_secret({
+            'metadata': {'name': 'mlflow-auth-config', 'namespace': self.namespace},
+            'data': mlflow_secret.data  # Already base64 encoded
+        })
 
     async def create_app_metadata(self):
         """Create application metadata ConfigMap."""
-        metadata = client.V1ConfigMap(
-            metadata=client.V1ObjectMeta(name=f'{self.app_name}-metadata', namespace=self.namespace),
-            data={
+        name = f'{self.app_name}-metadata'
+        metadata = {
+            'apiVersion': 'v1',
+            'kind': 'ConfigMap',
+            'metadata': {'name': name, 'namespace': self.namespace},
+            'data': {
                 'app_name': self.app_name,
                 'domain': self.domain,
                 'namespace': self.namespace,
-                'config': yaml.dump(self.thinkube_config)
+                # thinkube.yaml as read from disk - already YAML, no need to re-dump
+                'config': self._thinkube_yaml_raw
             }
+        }
+        await self.k8s_core.patch_namespaced_config_map(
+            name, self.namespace, metadata,
+            field_manager=FIELD_MANAGER,
+            force=True,
+            _content_type=APPLY_PATCH_CONTENT_TYPE
         )
-        try:
-            await self.k8s_core.create_namespaced_config_map(self.namespace, metadata)
-            DeploymentLogger.log(f"Created app metadata: {self.app_name}-metadata")
-        except ApiException as e:
-            if e.status == 409:
-                DeploymentLogger.log("App metadata already exists")
+        DeploymentLogger.log(f"Applied app metadata: {name}")
+
+    async def _keycloak_admin_token(self, session: aiohttp.ClientSession) -> str:
+        """Return a Keycloak admin token, reusing the cached one until it nears expiry.
+
+        The password grant is expensive on the Keycloak side, so the token is
+        memoized on the deployer and refreshed 30s before `expires_in` elapses.
+        """
+        if self._kc_token and time.monotonic() < self._kc_token[1] - 30:
+            return self._kc_token[0]
+
+        admin_username = self.secrets['admin_plain'].get('admin-username')
+        admin_password = self.secrets['admin_plain'].get('admin-password')
+        token_url = f"https://auth.{self.domain}/realms/master/protocol/openid-connect/token"
+        token_data = {
+            'client_id': 'admin-cli',
+            'username': admin_username,
+            'password': admin_password,
+            'grant_type': 'password'
+        }
+
+        async with session.post(token_url, data=token_data) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                DeploymentLogger.error(f"Failed to get Keycloak admin token: {resp.status} - {error_text}")
+                raise RuntimeError("Failed to get Keycloak admin token")
+            token_response = await resp.json()
+
+        access_token = token_response['access_token']
+        expires_in = token_response.get('expires_in', 60)
+        self._kc_token = (access_token, time.monotonic() + expires_in)
+        return access_token
 
     async def create_keycloak_client(self):
         """Create Keycloak OIDC client for the application (matches Ansible keycloak_client role)."""
-        admin_username = self._decode_secret_data(self.secrets['admin'], 'admin-username')
-        admin_password = self._decode_secret_data(self.secrets['admin'], 'admin-password')
         keycloak_url = f"https://auth.{self.domain}"
         keycloak_realm = self.params.get('keycloak_realm', 'thinkube')
         client_id = self.app_name
         app_host = f"{self.app_name}.{self.domain}"
 
-        async with aiohttp.ClientSession() as session:
-            # Step 1: Get Keycloak admin token
-            token_url = f"{keycloak_url}/realms/master/protocol/openid-connect/token"
-            token_data = {
-                'client_id': 'admin-cli',
-                'username': admin_username,
-                'password': admin_password,
-                'grant_type': 'password'
-            }
-
-            async with session.post(token_url, data=token_data, ssl=False) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    DeploymentLogger.error(f"Failed to get Keycloak admin token: {resp.status} - {error_text}")
-                    raise RuntimeError("Failed to get Keycloak admin token")
-                token_response = await resp.json()
-                access_token = token_response['access_token']
+        session = self._http_session()
+        # Step 1: Get Keycloak admin token (cached across calls)
+        access_token = await self._keycloak_admin_token(session)
 
-            headers = {
-                'Authorization': f'Bearer {access_token}',
-                'Content-Type': 'application/json'
-            }
+        headers = {
+            'Authorization': f'Bearer {access_token}',
+            'Content-Type': 'application/json'
+        }
 
-            # Step 2: Check if client already exists
-            clients_url = f"{keycloak_url}/admin/realms/{keycloak_realm}/clients"
-            query_url = f"{clients_url}?clientId={client_id}"
+        # Step 2: Check if client already exists
+        clients_url = f"{keycloak_url}/admin/realms/{keycloak_realm}/clients"
+        query_url = f"{clients_url}?clientId={client_id}"
 
-            async with session.get(query_url, headers=headers, ssl=False) as resp:
-                if resp.status != 200:
-                    error_text = await resp.text()
-                    DeploymentLogger.error(f"Failed to query Keycloak clients: {resp.status} - {error_text}")
-                    raise RuntimeError("Failed to query Keycloak clients")
-                existing_clients = await resp.json()
+        async with session.get(query_url, headers=headers) as resp:
+            if resp.status != 200:
+                error_text = await resp.text()
+                DeploymentLogger.error(f"Failed to query Keycloak clients: {resp.status} - {error_text}")
+                raise RuntimeError("Failed to query Keycloak clients")
+            existing_clients = await resp.json()
 
-            if len(existing_clients) > 0:
-                DeploymentLogger.log(f"Keycloak client '{client_id}' already exists")
-                return
+        if len(existing_clients) > 0:
+            DeploymentLogger.log(f"Keycloak client '{client_id}' already exists")
+            return
 
-            # Step 3: Create client (matches Ansible keycloak_client_body structure)
-            client_body = {
-                'clientId': client_id,
-                'enabled': True,
-                'rootUrl': f'https://{app_host}',
-                'baseUrl': f'https://{app_host}',
-                'redirectUris': [f'https://{app_host}/*'],
-                'webOrigins': [f'https://{app_host}'],
-                'publicClient': True,
-                'protocol': 'openid-connect'
-            }
+        # Step 3: Create client (matches Ansible keycloak_client_body structure)
+        client_body = {
+            'clientId': client_id,
+            'enabled': True,
+            'rootUrl': f'https://{app_host}',
+            'baseUrl': f'https://{app_host}',
+            'redirectUris': [f'https://{app_host}/*'],
+            'webOrigins': [f'https://{app_host}'],
+            'publicClient': True,
+            'protocol': 'openid-connect'
+        }
 
-            async with session.post(clients_url, headers=headers, json=client_body, ssl=False) as resp:
-                if resp.status == 201:
-                    DeploymentLogger.success(f"Created Keycloak client: {client_id}")
-                elif resp.status == 409:
-                    DeploymentLogger.log(f"Keycloak client '{client_id}' already exists (409)")
-                else:
-                    error_text = await resp.text()
-                    DeploymentLogger.error(f"Failed to create Keycloak client: {resp.status} - {error_text}")
-                    raise RuntimeError(f"Failed to create Keycloak client: {resp.status}")
+        async with session.post(clients_url, headers=headers, json=client_body) as resp:
+            if resp.status == 201:
+                DeploymentLogger.success(f"Created Keycloak client: {client_id}")
+            elif resp.status == 409:
+                DeploymentLogger.log(f"Keycloak client '{client_id}' already exists (409)")
+            else:
+                error_text = await resp.text()
+                DeploymentLogger.error(f"Failed to create Keycloak client: {resp.status} - {error_text}")
+                raise RuntimeError(f"Failed to create Keycloak client: {resp.status}")
 
     async def _exec_in_pod(self, namespace: str, pod: str, container: str, command: list) -> str:
         """Execute a command in a pod using kubernetes_asyncio stream API.
@@ -670,69 +1161,91 @@ git reset --hard origin/main
             )
             return resp
 
-    async def manage_databases(self):
-        """Create PostgreSQL databases using kubernetes exec (matches Ansible k8s_exec)."""
-        # Check if database is needed
-        services = self.thinkube_config.get('spec', {}).get('services', [])
+    async def _connect_postgres(self, user: str, password: str, database: str,
+                                timeout: float = POSTGRES_CONNECT_TIMEOUT):
+        """Open one asyncpg connection to the platform PostgreSQL service.
+
+        This is a network login to postgres.<domain>:5432 with password auth,
+        the same endpoint and credentials the backend uses.
+        """
+        return await asyncpg.connect(
+            host=f"postgres.{self.domain}",
+            port=5432,
+            user=user,
+            password=password,
+            database=database,
+            timeout=timeout
+        )
+
+    async def manage_databases(self):
+        """Recreate the app's PostgreSQL database.
+
+        Uses one asyncpg connection when possible; if asyncpg is missing or the
+        connection can't be made, psql is exec'd in the PostgreSQL pod (local
+        socket auth, no network login) as before.
+        """
+        # Check if database is needed
+        services = self.thinkube_config.get('spec', {}).get('services', [])
         if 'database' not in services:
             DeploymentLogger.log("Skipping database creation - not required by template")
             return
 
-        admin_username = self._decode_secret_data(self.secrets['admin'], 'admin-username')
+        admin_username = self.secrets['admin_plain'].get('admin-username')
+        admin_password = self.secrets['admin_plain'].get('admin-password')
 
         # Create database with hyphens replaced by underscores (matches postgresql.j2 template)
         db_name = self.app_name.replace('-', '_')
 
-        # DROP then CREATE using k8s exec (exactly like Ansible)
-        drop_sql = f'DROP DATABASE IF EXISTS {db_name};'
-        create_sql = f'CREATE DATABASE {db_name} OWNER {admin_username};'
+        # DROP then CREATE (exactly like Ansible). WITH (FORCE) (PostgreSQL 13+)
+        # terminates lingering app connections in the same statement instead of
+        # failing the DROP while pods are connected. Both run as separate simple
+        # statements - DROP/CREATE DATABASE can't run inside a transaction.
+        drop_sql = f'DROP DATABASE IF EXISTS "{db_name}" WITH (FORCE)'
+        # The owner stays unquoted, as before: roles are matched case-folded
+        create_sql = f'CREATE DATABASE "{db_name}" OWNER {admin_username}'
 
-        # Run DROP
-        try:
-            drop_result = await self._exec_in_pod(
-                namespace='postgres',
-                pod='postgresql-official-0',
-                container='postgres',
-                command=['psql', '-U', admin_username, '-d', 'postgres', '-c', drop_sql]
-            )
-            DeploymentLogger.log(f"Dropped database {db_name}")
-        except Exception as e:
-            DeploymentLogger.error(f"DROP DATABASE {db_name} failed: {e}")
-            raise RuntimeError(f"DROP DATABASE {db_name} failed: {e}")
+        conn = None
+        if asyncpg is not None:
+            try:
+                conn = await self._connect_postgres(admin_username, admin_password, 'postgres')
+            except Exception as e:
+                DeploymentLogger.log(f"PostgreSQL connection failed ({e}), using psql in the pod")
 
-        # Run CREATE
         try:
-            create_result = await self._exec_in_pod(
-                namespace='postgres',
-                pod='postgresql-official-0',
-                container='postgres',
-                command=['psql', '-U', admin_username, '-d', 'postgres', '-c', create_sql]
-            )
-            DeploymentLogger.log(f"Created database {db_name}")
+            if conn is not None:
+                try:
+                    await conn.execute(drop_sql)
+                    await conn.execute(create_sql)
+                finally:
+                    await conn.close()
+            else:
+                # psql runs each -c in its own transaction and ON_ERROR_STOP
+                # keeps CREATE from running if DROP fails
+                await self._exec_in_pod(
+                    namespace='postgres',
+                    pod='postgresql-official-0',
+                    container='postgres',
+                    command=[
+                        'psql', '-U', admin_username, '-d', 'postgres',
+                        '-v', 'ON_ERROR_STOP=1',
+                        '-c', drop_sql,
+                        '-c', create_sql,
+                    ]
+                )
+            DeploymentLogger.log(f"Recreated database {db_name}")
         except Exception as e:
-            DeploymentLogger.error(f"CREATE DATABASE {db_name} failed: {e}")
-            raise RuntimeError(f"CREATE DATABASE {db_name} failed: {e}")
+            DeploymentLogger.error(f"Recreating database {db_name} failed: {e}")
+            raise RuntimeError(f"Recreating database {db_name} failed: {e}")
 
     async def _generate_workflow_template(self) -> dict:
         """Generate a WorkflowTemplate using the Jinja2 template from templates/k8s/build-workflow.j2."""
-        # Template path - inside container it's at /home/thinkube/thinkube-control/templates
-        template_path = Path("/home/thinkube/thinkube-control/templates/k8s/build-workflow.j2")
+        template_path = TEMPLATES_DIR / 'build-workflow.j2'
 
         if not template_path.exists():
             raise FileNotFoundError(f"Workflow template not found: {template_path}")
 
-        # Read the Jinja2 template
-        with open(template_path, 'r') as f:
-            template_content = f.read()
-
-        # Create Jinja2 environment
-        env = jinja2.Environment(
-            loader=jinja2.BaseLoader(),
-            undefined=jinja2.StrictUndefined,
-            trim_blocks=True,
-            lstrip_blocks=True
-        )
-        template = env.from_string(template_content)
+        # Load (and compile on first use) off the event loop
+        template = await asyncio.to_thread(_JINJA_ENV.get_template, 'build-workflow.j2')
 
         # Get required variables
         system_username = self.params.get('system_username') or os.environ.get('SYSTEM_USERNAME')
@@ -741,7 +1254,7 @@ git reset --hard origin/main
         master_node_name = self.params.get('master_node_name') or os.environ.get('MASTER_NODE_NAME')
         if not master_node_name:
             raise ValueError("master_node_name not in params and MASTER_NODE_NAME env var not set")
-        admin_password = self._decode_secret_data(self.secrets['admin'], 'admin-password')
+        admin_password = self.secrets['admin_plain'].get('admin-password')
 
         # Detect unique architectures across cluster nodes
         nodes = await self.k8s_core.list_node()
@@ -769,7 +1282,7 @@ git reset --hard origin/main
         rendered = template.render(**render_vars)
 
         # Parse the rendered YAML
-        workflow_spec = yaml.safe_load(rendered)
+        workflow_spec = await asyncio.to_thread(yaml.load, rendered, Loader=SafeLoader)
 
         return workflow_spec
 
@@ -944,38 +1457,29 @@ git reset --hard origin/main
         if not self.thinkube_config:
             thinkube_path = Path(self.local_repo_path) / 'thinkube.yaml'
             if thinkube_path.exists():
-                with open(thinkube_path, 'r') as f:
-                    self.thinkube_config = yaml.safe_load(f)
-
-        # Setup Jinja2 environment
-        template_dir = Path("/home/thinkube/thinkube-control/templates/k8s")
-        env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(str(template_dir)),
-            undefined=jinja2.StrictUndefined,
-            lstrip_blocks=True,
-            trim_blocks=True
-        )
-        # Add to_yaml and to_json filters
-        env.filters['to_yaml'] = lambda x: yaml.dump(x, default_flow_style=False)
-        env.filters['to_json'] = lambda x: json.dumps(x)
+                self._thinkube_yaml_raw = thinkube_path.read_text()
+                self.thinkube_config = yaml.load(self._thinkube_yaml_raw, Loader=SafeLoader)
+
+        # Shared Jinja2 environment (templates compiled once per process)
+        env = _JINJA_ENV
 
         # Common template variables
         container_registry = f"registry.{self.domain}"
-        admin_password = self._decode_secret_data(self.secrets['admin'], 'admin-password')
+        admin_password = self.secrets['admin_plain'].get('admin-password')
 
         # Get MLflow credentials
-        mlflow_secret = self.secrets.get('mlflow', {}).get('secret')
-        mlflow_keycloak_token_url = self._decode_secret_data(mlflow_secret, 'keycloak-token-url') if mlflow_secret else ''
-        mlflow_keycloak_client_id = self._decode_secret_data(mlflow_secret, 'client-id') if mlflow_secret else ''
-        mlflow_client_secret = self._decode_secret_data(mlflow_secret, 'client-secret') if mlflow_secret else ''
-        mlflow_username = self._decode_secret_data(mlflow_secret, 'username') if mlflow_secret else ''
-        mlflow_password = self._decode_secret_data(mlflow_secret, 'password') if mlflow_secret else admin_password
+        mlflow_secret = self.secrets.get('mlflow_plain')
+        mlflow_keycloak_token_url = mlflow_secret.get('keycloak-token-url') if mlflow_secret else ''
+        mlflow_keycloak_client_id = mlflow_secret.get('client-id') if mlflow_secret else ''
+        mlflow_client_secret = mlflow_secret.get('client-secret') if mlflow_secret else ''
+        mlflow_username = mlflow_secret.get('username') if mlflow_secret else ''
+        mlflow_password = mlflow_secret.get('password') if mlflow_secret else admin_password
 
         # Get SeaweedFS S3 credentials (from seaweedfs-s3-credentials in seaweedfs namespace)
-        seaweedfs_secret = self.secrets.get('seaweedfs')
-        seaweedfs_password = self._decode_secret_data(seaweedfs_secret, 'secret_key') if seaweedfs_secret else ''
-        seaweedfs_access_key = self._decode_secret_data(seaweedfs_secret, 'access_key') if seaweedfs_secret else ''
-        seaweedfs_endpoint = self._decode_secret_data(seaweedfs_secret, 'endpoint_internal') if seaweedfs_secret else ''
+        seaweedfs_secret = self.secrets.get('seaweedfs_plain')
+        seaweedfs_password = seaweedfs_secret.get('secret_key') if seaweedfs_secret else ''
+        seaweedfs_access_key = seaweedfs_secret.get('access_key') if seaweedfs_secret else ''
+        seaweedfs_endpoint = seaweedfs_secret.get('endpoint_internal') if seaweedfs_secret else ''
 
         # Build manifest_params from self.params — these are template-specific
         # parameters (e.g., model_id) that should be injected as env vars
@@ -1237,37 +1741,19 @@ spec:
 
         template_name = workflow_spec['metadata']['name']
 
-        try:
-            await self.k8s_custom.create_namespaced_custom_object(
-                group="argoproj.io",
-                version="v1alpha1",
-                namespace="argo",
-                plural="workflowtemplates",
-                body=workflow_spec
-            )
-            DeploymentLogger.log(f"Deployed workflow template: {template_name}")
-        except ApiException as e:
-            if e.status == 409:
-                # Get existing template to retrieve resourceVersion
-                existing = await self.k8s_custom.get_namespaced_custom_object(
-                    group="argoproj.io",
-                    version="v1alpha1",
-                    namespace="argo",
-                    plural="workflowtemplates",
-                    name=template_name
-                )
-                # Set resourceVersion for update
-                workflow_spec['metadata']['resourceVersion'] = existing['metadata']['resourceVersion']
-
-                await self.k8s_custom.replace_namespaced_custom_object(
-                    group="argoproj.io",
-                    version="v1alpha1",
-                    namespace="argo",
-                    plural="workflowtemplates",
-                    name=template_name,
-                    body=workflow_spec
-                )
-                DeploymentLogger.log(f"Updated workflow template: {template_name}")
+        # Server-side apply creates or updates in one call - no resourceVersion round trip
+        await self.k8s_custom.patch_namespaced_custom_object(
+            group="argoproj.io",
+            version="v1alpha1",
+            namespace="argo",
+            plural="workflowtemplates",
+            name=template_name,
+            body=workflow_spec,
+            field_manager=FIELD_MANAGER,
+            force=True,
+            _content_type=APPLY_PATCH_CONTENT_TYPE
+        )
+        DeploymentLogger.log(f"Applied workflow template: {template_name}")
 
     # ==================== PHASE 4: Git Operations ====================
 
@@ -1294,20 +1780,23 @@ spec:
         with ThreadPoolExecutor(max_workers=1) as executor:
             await loop.run_in_executor(executor, self.generate_k8s_manifests)
 
-        await self.ensure_gitea_repo()
+        await self._gitea_task  # started in Phase 2
 
         # Wait for Gitea to fully initialize the repository (database + filesystem sync)
         DeploymentLogger.debug(" Waiting 10 seconds for Gitea to stabilize...")
         await asyncio.sleep(10)
 
-        await self.configure_webhook()
-
+        # Webhook (Gitea API), ArgoCD app and the workflow snapshot (k8s API)
+        # are independent of each other; all three complete before the push.
         # CRITICAL: Create ArgoCD application BEFORE git push
         # This prevents race condition where Harbor webhook fires before ArgoCD app exists
-        await self.deploy_argocd_app()
-
         # Get existing workflow names BEFORE git push so we can detect NEW workflows
-        existing_workflows = await self._get_existing_workflow_names()
+        # (a snapshot taken after the push could already contain the new one)
+        _, _, existing_workflows = await asyncio.gather(
+            self.configure_webhook(),
+            self.deploy_argocd_app(),
+            self._get_existing_workflow_names(),
+        )
 
         await self.git_commit_and_push()
 
@@ -1321,272 +1810,123 @@ spec:
 
         DeploymentLogger.success("Phase 4 complete - build succeeded!")
 
-    def _run_migration_sync(self, migration_script: str, cwd: str) -> tuple:
-        """Synchronous migration execution (runs in thread pool to avoid blocking event loop)."""
-        result = subprocess.run(
-            migration_script,
-            shell=True,
-            capture_output=True,
-            text=True,
-            cwd=cwd,
-            timeout=120  # 2 minute timeout for migrations
-        )
-        return result.returncode, result.stdout, result.stderr
-
     async def generate_migrations(self):
         """Generate Alembic migrations for containers that need them (matches Ansible)."""
         containers = self.thinkube_config.get('spec', {}).get('containers', [])
 
-        for container in containers:
-            migrations = container.get('migrations', {})
-            if migrations.get('tool') != 'alembic':
-                continue
-
-            build_path = container.get('build', 'backend')
-            container_path = Path(self.local_repo_path) / build_path
-
-            # Check if alembic.ini exists
-            alembic_ini = container_path / 'alembic.ini'
-            if not alembic_ini.exists():
-                DeploymentLogger.log(f"No alembic.ini in {build_path}, skipping migrations")
-                continue
+        # Each container has its own alembic setup - run them concurrently, but
+        # no more alembic interpreters at once than there are CPUs
+        await gather_with_concurrency(
+            min(self._max_concurrency, os.cpu_count() or 1),
+            *(
+                self._run_migration(container)
+                for container in containers
+                if container.get('migrations', {}).get('tool') == 'alembic'
+            )
+        )
 
-            admin_username = self._decode_secret_data(self.secrets['admin'], 'admin-username')
-            admin_password = self._decode_secret_data(self.secrets['admin'], 'admin-password')
-            db_name = self.app_name.replace('-', '_')
-            app_host = f"{self.app_name}.{self.domain}"
+    async def _run_migration(self, container: dict):
+        """Run `alembic revision --autogenerate` for one container, streaming its output."""
+        build_path = container.get('build', 'backend')
+        container_path = Path(self.local_repo_path) / build_path
 
-            # Build migration script (matches Ansible environment setup)
-            migration_script = f"""
-set -e
-cd {container_path}
-
-# Set up database connection
-export POSTGRES_USER="{admin_username}"
-export POSTGRES_PASSWORD="{admin_password}"
-export POSTGRES_HOST="postgres.{self.domain}"
-export POSTGRES_PORT="5432"
-export POSTGRES_DATABASE="{db_name}"
-
-# Set required application config vars for Pydantic Settings validation
-export KEYCLOAK_URL="https://auth.{self.domain}"
-export KEYCLOAK_REALM="thinkube"
-export KEYCLOAK_CLIENT_ID="{self.namespace}"
-export KEYCLOAK_CLIENT_SECRET="dummy"
-export FRONTEND_URL="https://{app_host}"
-
-# Set Python path for model imports
-export PYTHONPATH="{container_path}:$PYTHONPATH"
-
-# Generate migrations
-echo "Generating migrations..."
-if alembic revision --autogenerate -m "initial_schema"; then
-    echo "Migration generated successfully"
-else
-    echo "Migration generation failed or no changes detected"
-fi
-"""
+        # Check if alembic.ini exists
+        alembic_ini = container_path / 'alembic.ini'
+        if not alembic_ini.exists():
+            DeploymentLogger.log(f"No alembic.ini in {build_path}, skipping migrations")
+            return
 
-            # Run migration in thread pool to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
+        admin_username = self.secrets['admin_plain'].get('admin-username')
+        admin_password = self.secrets['admin_plain'].get('admin-password')
+        db_name = self.app_name.replace('-', '_')
+        app_host = f"{self.app_name}.{self.domain}"
 
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                returncode, stdout, stderr = await loop.run_in_executor(
-                    executor,
-                    partial(self._run_migration_sync, migration_script, str(container_path))
-                )
+        # Environment matches the Ansible setup; passed directly rather than
+        # through exported shell variables
+        pythonpath = os.environ.get('PYTHONPATH')
+        env = {
+            **os.environ,
+            # Database connection
+            'POSTGRES_USER': admin_username,
+            'POSTGRES_PASSWORD': admin_password,
+            'POSTGRES_HOST': f"postgres.{self.domain}",
+            'POSTGRES_PORT': "5432",
+            'POSTGRES_DATABASE': db_name,
+            # Required application config vars for Pydantic Settings validation
+            'KEYCLOAK_URL': f"https://auth.{self.domain}",
+            'KEYCLOAK_REALM': "thinkube",
+            'KEYCLOAK_CLIENT_ID': self.namespace,
+            'KEYCLOAK_CLIENT_SECRET': "dummy",
+            'FRONTEND_URL': f"https://{app_host}",
+            # Python path for model imports
+            'PYTHONPATH': f"{container_path}:{pythonpath}" if pythonpath else str(container_path),
+        }
 
-            if returncode == 0:
-                DeploymentLogger.log(f"Generated Alembic migrations for {build_path}")
-            else:
-                DeploymentLogger.log(f"Migration generation: {stderr.strip()}")
+        DeploymentLogger.log(f"Generating migrations for {build_path}...")
+        process = await asyncio.create_subprocess_exec(
+            'alembic', 'revision', '--autogenerate', '-m', 'initial_schema',
+            cwd=str(container_path),
+            env=env,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    self._pump_stream(process.stdout, "ALEMBIC"),
+                    self._pump_stream(process.stderr, "ALEMBIC"),
+                    process.wait()
+                ),
+                timeout=120  # 2 minute timeout for migrations
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            DeploymentLogger.error(f"Migration generation for {build_path} timed out after 120s")
+            raise RuntimeError(f"Alembic migration generation timed out for {build_path}")
+
+        if process.returncode == 0:
+            DeploymentLogger.log(f"Generated Alembic migrations for {build_path}")
+        else:
+            DeploymentLogger.log(f"Migration generation failed or no changes detected for {build_path}")
 
     async def setup_git_hooks(self):
         """Setup git hooks for thinkube.yaml manifest regeneration."""
-        hooks_dir = Path(self.local_repo_path) / '.git' / 'hooks'
+        repo = Path(self.local_repo_path)
+        hooks_dir = repo / '.git' / 'hooks'
         hooks_dir.mkdir(parents=True, exist_ok=True)
-        git_hooks_dir = Path(self.local_repo_path) / '.git-hooks'
+        git_hooks_dir = repo / '.git-hooks'
         git_hooks_dir.mkdir(parents=True, exist_ok=True)
 
-        control_url = f"https://control.{self.domain}"
-
-        # Pre-commit hook — regenerates k8s/ manifests when thinkube.yaml changes
-        pre_commit_content = f'''#!/bin/bash
-# Git pre-commit hook to regenerate k8s/ manifests when thinkube.yaml changes
-# AUTO-GENERATED - DO NOT EDIT
-
-GREEN='\\033[0;32m'
-YELLOW='\\033[1;33m'
-RED='\\033[0;31m'
-NC='\\033[0m'
-
-APP_NAME="{self.app_name}"
-DOMAIN_NAME="{self.domain}"
-CONTROL_URL="{control_url}"
-
-# Check if thinkube.yaml has been modified in this commit
-if ! git diff --cached --name-only | grep -q '^thinkube\\.yaml$'; then
-    exit 0
-fi
-
-echo -e "${{YELLOW}}Pre-commit hook: thinkube.yaml changed, regenerating k8s/ manifests...${{NC}}"
-
-# Get auth token
-TOKEN_FILE="$HOME/.thinkube/api-token"
-if [ -f "$TOKEN_FILE" ]; then
-    API_TOKEN=$(cat "$TOKEN_FILE")
-else
-    API_TOKEN="${{THINKUBE_API_TOKEN:-}}"
-fi
-
-if [ -z "$API_TOKEN" ]; then
-    echo -e "${{RED}}ERROR: No API token found.${{NC}}"
-    echo "Set THINKUBE_API_TOKEN or create $TOKEN_FILE"
-    echo "You can generate an API token at ${{CONTROL_URL}}/api-tokens"
-    exit 1
-fi
-
-# Call thinkube-control API to regenerate manifests
-RESPONSE=$(curl -s -w "\\n%{{http_code}}" \\
-    -X POST \\
-    -H "Authorization: Bearer ${{API_TOKEN}}" \\
-    -H "Content-Type: application/json" \\
-    "${{CONTROL_URL}}/api/v1/templates/apps/${{APP_NAME}}/regenerate-manifests" \\
-    2>&1)
-
-HTTP_CODE=$(echo "$RESPONSE" | tail -1)
-BODY=$(echo "$RESPONSE" | sed '$d')
-
-if [ "$HTTP_CODE" != "200" ]; then
-    echo -e "${{RED}}ERROR: Failed to regenerate manifests (HTTP ${{HTTP_CODE}})${{NC}}"
-    echo "$BODY"
-    echo ""
-    echo "You can still commit without manifest regeneration by using:"
-    echo "  git commit --no-verify"
-    exit 1
-fi
-
-# Stage the regenerated k8s/ files
-if [ -d "k8s" ]; then
-    git add k8s/
-    echo -e "${{GREEN}}k8s/ manifests regenerated and staged for commit.${{NC}}"
-fi
-
-exit 0
-'''
-
-        # Write pre-commit hook to both locations
-        for hook_path in [hooks_dir / 'pre-commit', git_hooks_dir / 'pre-commit']:
-            with open(hook_path, 'w') as f:
-                f.write(pre_commit_content)
-            hook_path.chmod(0o755)
-
-        # Create install-hooks.sh
-        install_hooks_content = '''#!/bin/bash
-# Reinstall git hooks if needed
-echo "Installing git hooks..."
-mkdir -p .git/hooks
-cp .git-hooks/pre-commit .git/hooks/pre-commit
-chmod +x .git/hooks/pre-commit
-echo "Git hooks installed!"
-echo "When you modify thinkube.yaml and commit, k8s/ manifests are automatically regenerated."
-'''
-        install_hooks_path = Path(self.local_repo_path) / 'install-hooks.sh'
-        with open(install_hooks_path, 'w') as f:
-            f.write(install_hooks_content)
-        install_hooks_path.chmod(0o755)
-
-        # Create regenerate-manifests.sh
-        regen_content = f'''#!/bin/bash
-# Manually regenerate k8s/ manifests from thinkube.yaml
-# AUTO-GENERATED - DO NOT EDIT
-
-APP_NAME="{self.app_name}"
-DOMAIN_NAME="{self.domain}"
-CONTROL_URL="{control_url}"
-
-TOKEN_FILE="$HOME/.thinkube/api-token"
-if [ -f "$TOKEN_FILE" ]; then
-    API_TOKEN=$(cat "$TOKEN_FILE")
-else
-    API_TOKEN="${{THINKUBE_API_TOKEN:-}}"
-fi
-
-if [ -z "$API_TOKEN" ]; then
-    echo "ERROR: No API token found."
-    echo "Set THINKUBE_API_TOKEN or create $TOKEN_FILE"
-    exit 1
-fi
-
-echo "Regenerating k8s/ manifests for ${{APP_NAME}}..."
-
-RESPONSE=$(curl -s -w "\\n%{{http_code}}" \\
-    -X POST \\
-    -H "Authorization: Bearer ${{API_TOKEN}}" \\
-    -H "Content-Type: application/json" \\
-    "${{CONTROL_URL}}/api/v1/templates/apps/${{APP_NAME}}/regenerate-manifests")
-
-HTTP_CODE=$(echo "$RESPONSE" | tail -1)
-BODY=$(echo "$RESPONSE" | sed '$d')
-
-if [ "$HTTP_CODE" = "200" ]; then
-    echo "Manifests regenerated successfully."
-    echo "$BODY" | python3 -c "import sys,json; d=json.load(sys.stdin); print(f\\"Files: {{', '.join(d['files_generated'])}}\\")" 2>/dev/null || true
-else
-    echo "ERROR: Failed (HTTP ${{HTTP_CODE}})"
-    echo "$BODY"
-    exit 1
-fi
-'''
-        regen_path = Path(self.local_repo_path) / 'regenerate-manifests.sh'
-        with open(regen_path, 'w') as f:
-            f.write(regen_content)
-        regen_path.chmod(0o755)
-
-        # Create DEVELOPMENT.md
-        development_md_content = '''# Development Workflow
-
-This repository is hosted on Gitea for local development with Thinkube.
-
-## Making Changes
-
-Edit your code and commit as normal:
-```bash
-git add .
-git commit -m "Your changes"
-git push
-```
-
-Pushing to Gitea triggers a build and deploy automatically.
-
-## Changing App Configuration
-
-If you modify `thinkube.yaml` (add containers, change routes, add services):
-
-1. Edit `thinkube.yaml`
-2. Commit — the pre-commit hook automatically regenerates `k8s/` manifests
-3. Push — the build picks up the new configuration
-
-To manually regenerate manifests without committing:
-```bash
-./regenerate-manifests.sh
-```
-
-## Publishing as a Template
-
-To share your app as a reusable template, use the "Publish as Template"
-feature in the Thinkube Control UI. Your code is already template-ready —
-no transformation needed.
-'''
-        dev_md_path = Path(self.local_repo_path) / 'DEVELOPMENT.md'
-        with open(dev_md_path, 'w') as f:
-            f.write(development_md_content)
+        render_vars = {
+            'app_name': self.app_name,
+            'domain': self.domain,
+            'control_url': f"https://control.{self.domain}",
+        }
+        rendered = {
+            name: _HELPER_ENV.get_template(name).render(render_vars)
+            for name in _HELPER_TEMPLATES
+        }
 
-        # Clean up obsolete scripts from previous deployments
+        # (path, content, mode); the pre-commit hook — which regenerates k8s/
+        # manifests when thinkube.yaml changes — goes to both hook locations
+        files = [
+            (hooks_dir / 'pre-commit', rendered['pre-commit'], 0o755),
+            (git_hooks_dir / 'pre-commit', rendered['pre-commit'], 0o755),
+            (repo / 'install-hooks.sh', rendered['install-hooks.sh'], 0o755),
+            (repo / 'regenerate-manifests.sh', rendered['regenerate-manifests.sh'], 0o755),
+            (repo / 'DEVELOPMENT.md', rendered['DEVELOPMENT.md'], None),
+        ]
+        # Independent files: write them off the event loop, all at once
+        await asyncio.gather(*(
+            asyncio.to_thread(_write_file, path, content, mode) for path, content, mode in files
+        ))
+
+        # Clean up obsolete scripts from previous deployments (the old
+        # reprocess-templates.sh spawned one sed per .jinja file; templates are
+        # now rendered server-side, so the script is simply removed)
         for obsolete in ['reprocess-templates.sh', 'prepare-for-github.sh']:
-            obsolete_path = Path(self.local_repo_path) / obsolete
-            if obsolete_path.exists():
-                obsolete_path.unlink()
+            (repo / obsolete).unlink(missing_ok=True)
 
         DeploymentLogger.log("Setup git hooks and helper scripts")
 
@@ -1597,8 +1937,7 @@ no transformation needed.
         if token_file.exists():
             return
         try:
-            mcp_secret = await self.k8s_core.read_namespaced_secret('mcp-default-token', 'thinkube-control')
-            api_token = self._decode_secret_data(mcp_secret, 'token')
+            api_token = await self._get_mcp_token()
             token_dir.mkdir(parents=True, exist_ok=True)
             token_file.write_text(api_token)
             token_file.chmod(0o600)
@@ -1616,82 +1955,122 @@ no transformation needed.
         checks for existing webhooks before creating. This function now detects
         and removes duplicate webhooks to prevent duplicate workflow triggers.
         """
-        gitea_token = self._decode_secret_data(self.secrets['gitea'], 'token')
+        gitea_token = self.secrets['gitea_plain'].get('token')
         gitea_hostname = f"git.{self.domain}"
         webhook_url = f"https://argo-events.{self.domain}/gitea"
         org = "thinkube-deployments"
         repo = self.gitea_repo_name
 
-        # Get webhook secret from Argo namespace
-        try:
-            webhook_secret_obj = await self.k8s_core.read_namespaced_secret('gitea-webhook-secret', 'argo')
-            webhook_secret = self._decode_secret_data(webhook_secret_obj, 'secret')
-        except ApiException as e:
-            DeploymentLogger.error(f"Failed to get webhook secret: {e}")
-            raise
+        webhook_secret = await self._get_webhook_secret()
 
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                'Authorization': f'token {gitea_token}',
-                'Content-Type': 'application/json'
-            }
+        # Desired webhook state; the (org, repo, url) triple identifies it
+        webhook_payload = {
+            'type': 'gitea',
+            'config': {
+                'url': webhook_url,
+                'content_type': 'json',
+                'secret': webhook_secret
+            },
+            'events': ['push'],
+            'active': True
+        }
 
-            # 1. Get all existing webhooks
-            hooks_url = f"https://{gitea_hostname}/api/v1/repos/{org}/{repo}/hooks"
-            async with session.get(hooks_url, headers=headers, ssl=False) as resp:
-                if resp.status != 200:
-                    DeploymentLogger.error(f"Failed to get webhooks: {resp.status}")
-                    raise RuntimeError(f"Failed to fetch existing webhooks: {resp.status}")
-                existing_hooks = await resp.json()
-
-            # 2. Find ALL webhooks matching our URL
-            matching_hooks = [
-                hook for hook in existing_hooks
-                if hook.get('config', {}).get('url') == webhook_url
-            ]
+        session = self._http_session()
+        headers = {
+            'Authorization': f'token {gitea_token}',
+            'Content-Type': 'application/json'
+        }
+        hooks_url = f"https://{gitea_hostname}/api/v1/repos/{org}/{repo}/hooks"
 
-            # 3. Handle based on count
-            if len(matching_hooks) == 0:
-                # No webhook exists - create one
-                webhook_payload = {
-                    'type': 'gitea',
-                    'config': {
-                        'url': webhook_url,
-                        'content_type': 'json',
-                        'secret': webhook_secret
-                    },
-                    'events': ['push'],
-                    'active': True
-                }
-                async with session.post(hooks_url, headers=headers, json=webhook_payload, ssl=False) as resp:
-                    if resp.status == 201:
-                        webhook_data = await resp.json()
-                        webhook_id = webhook_data['id']
-                        DeploymentLogger.success(f"Created webhook ID {webhook_id} for {org}/{repo}")
-                    else:
-                        error_text = await resp.text()
-                        DeploymentLogger.error(f"Failed to create webhook: {resp.status} - {error_text}")
-                        raise RuntimeError(f"Failed to create webhook: {resp.status}")
+        # 1. Find ALL existing webhooks matching our URL
+        matching_hooks = await self._list_matching_webhooks(session, hooks_url, headers, webhook_url)
 
-            elif len(matching_hooks) == 1:
-                # Exactly one webhook - nothing to do
-                DeploymentLogger.log(f"Webhook already configured for {org}/{repo}")
+        # 2. None exists - create one
+        if not matching_hooks:
+            async with session.post(hooks_url, headers=headers, json=webhook_payload) as resp:
+                if resp.status == 201:
+                    webhook_data = await resp.json()
+                    DeploymentLogger.success(f"Created webhook ID {webhook_data['id']} for {org}/{repo}")
+                    return
+                error_text = await resp.text()
+
+            # A concurrent deploy may have created it meanwhile - re-list once before failing
+            matching_hooks = await self._list_matching_webhooks(session, hooks_url, headers, webhook_url)
+            if not matching_hooks:
+                DeploymentLogger.error(f"Failed to create webhook: {resp.status} - {error_text}")
+                raise RuntimeError(f"Failed to create webhook: {resp.status}")
+            DeploymentLogger.log(f"Webhook for {org}/{repo} was created concurrently")
+
+        # 3. Multiple webhooks found - delete duplicates (keep the first one)
+        keep_hook = matching_hooks[0]
+        if len(matching_hooks) > 1:
+            DeploymentLogger.log(f"Found {len(matching_hooks)} duplicate webhooks for {org}/{repo}, cleaning up...")
+
+            async def delete_hook(hook_id):
+                async with session.delete(f"{hooks_url}/{hook_id}", headers=headers) as resp:
+                    if resp.status == 204:
+                        DeploymentLogger.log(f"Deleted duplicate webhook ID {hook_id}")
+                    else:
+                        DeploymentLogger.error(f"Failed to delete webhook {hook_id}: {resp.status}")
+
+            # Independent DELETEs - issue them together over the keep-alive pool
+            await asyncio.gather(*(delete_hook(hook['id']) for hook in matching_hooks[1:]))
+            DeploymentLogger.success(f"Cleaned up duplicates, kept webhook ID {keep_hook['id']}")
+
+        # 4. PATCH the kept webhook only if it drifted from the desired state
+        # (Gitea never returns the secret, so it can't be part of the comparison)
+        drifted = (
+            set(keep_hook.get('events') or []) != set(webhook_payload['events'])
+            or keep_hook.get('config', {}).get('content_type') != 'json'
+            or not keep_hook.get('active', False)
+        )
+        if not drifted:
+            DeploymentLogger.log(f"Webhook already configured for {org}/{repo}")
+            return
 
+        patch_body = {k: webhook_payload[k] for k in ('config', 'events', 'active')}
+        async with session.patch(f"{hooks_url}/{keep_hook['id']}", headers=headers, json=patch_body) as resp:
+            if resp.status == 200:
+                DeploymentLogger.log(f"Updated drifted webhook ID {keep_hook['id']} for {org}/{repo}")
             else:
-                # Multiple webhooks found - delete duplicates (keep the first one)
-                DeploymentLogger.log(f"Found {len(matching_hooks)} duplicate webhooks for {org}/{repo}, cleaning up...")
-                keep_hook_id = matching_hooks[0]['id']
+                error_text = await resp.text()
+                DeploymentLogger.error(f"Failed to update webhook: {resp.status} - {error_text}")
+                raise RuntimeError(f"Failed to update webhook: {resp.status}")
+
+    @staticmethod
+    async def _list_matching_webhooks(session, hooks_url: str, headers: dict, webhook_url: str) -> list:
+        """List the repo's webhooks that point at `webhook_url`."""
+        async with session.get(hooks_url, headers=headers) as resp:
+            if resp.status != 200:
+                DeploymentLogger.error(f"Failed to get webhooks: {resp.status}")
+                raise RuntimeError(f"Failed to fetch existing webhooks: {resp.status}")
+            existing_hooks = await resp.json()
+        return [
+            hook for hook in existing_hooks
+            if hook.get('config', {}).get('url') == webhook_url
+        ]
+
+    async def _get_webhook_secret(self) -> str:
+        """Read the Gitea webhook secret from the Argo namespace (once per deployer)."""
+        if self._webhook_secret is None:
+            try:
+                webhook_secret_obj = await self.k8s_core.read_namespaced_secret('gitea-webhook-secret', 'argo')
+                self._webhook_secret = self._decode_secret_data(webhook_secret_obj, 'secret')
+            except ApiException as e:
+                DeploymentLogger.error(f"Failed to get webhook secret: {e}")
+                raise
+        return self._webhook_secret
 
-                for hook in matching_hooks[1:]:
-                    hook_id = hook['id']
-                    delete_url = f"{hooks_url}/{hook_id}"
-                    async with session.delete(delete_url, headers=headers, ssl=False) as resp:
-                        if resp.status == 204:
-                            DeploymentLogger.log(f"Deleted duplicate webhook ID {hook_id}")
-                        else:
-                            DeploymentLogger.error(f"Failed to delete webhook {hook_id}: {resp.status}")
+    async def _get_mcp_token(self) -> str:
+        """Read the MCP default API token for thinkube-control (once per deployer).
 
-                DeploymentLogger.success(f"Cleaned up duplicates, kept webhook ID {keep_hook_id}")
+        Raises ApiException if the secret is missing; callers decide whether
+        that is fatal.
+        """
+        if self._mcp_token is None:
+            mcp_secret = await self.k8s_core.read_namespaced_secret('mcp-default-token', 'thinkube-control')
+            self._mcp_token = self._decode_secret_data(mcp_secret, 'token')
+        return self._mcp_token
 
     def _run_git_sync(self, git_script: str, cwd: str) -> tuple:
         """Synchronous git execution (runs in thread pool to avoid blocking event loop)."""
@@ -1707,74 +2086,128 @@ no transformation needed.
 
     async def _delete_gitea_repo(self, org: str, repo: str):
         """Delete a Gitea repository via API."""
-        gitea_token = self._decode_secret_data(self.secrets['gitea'], 'token')
+        gitea_token = self.secrets['gitea_plain'].get('token')
         gitea_hostname = f"git.{self.domain}"
 
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                'Authorization': f'token {gitea_token}',
-                'Content-Type': 'application/json'
-            }
-            delete_url = f"https://{gitea_hostname}/api/v1/repos/{org}/{repo}"
-            async with session.delete(delete_url, headers=headers, ssl=False) as resp:
-                if resp.status == 204:
-                    DeploymentLogger.log(f"Deleted corrupted Gitea repository: {org}/{repo}")
-                    return True
-                elif resp.status == 404:
-                    DeploymentLogger.log(f"Repository {org}/{repo} not found (already deleted)")
-                    return True
-                else:
-                    error_text = await resp.text()
-                    DeploymentLogger.error(f"Failed to delete repo: {resp.status} - {error_text}")
-                    return False
+        session = self._http_session()
+        headers = {
+            'Authorization': f'token {gitea_token}',
+            'Content-Type': 'application/json'
+        }
+        delete_url = f"https://{gitea_hostname}/api/v1/repos/{org}/{repo}"
+        async with session.delete(delete_url, headers=headers) as resp:
+            if resp.status == 204:
+                DeploymentLogger.log(f"Deleted corrupted Gitea repository: {org}/{repo}")
+                return True
+            elif resp.status == 404:
+                DeploymentLogger.log(f"Repository {org}/{repo} not found (already deleted)")
+                return True
+            else:
+                error_text = await resp.text()
+                DeploymentLogger.error(f"Failed to delete repo: {resp.status} - {error_text}")
+                return False
+
+    async def _git(self, *args: str, check: bool = True, env: Optional[Dict[str, str]] = None) -> int:
+        """Run one git command in the app repo (argv exec, no shell).
+
+        stderr (where git reports progress and errors) is streamed to the log
+        as it arrives; stdout is unused by callers and discarded. Raises
+        subprocess.CalledProcessError carrying the stderr tail on a non-zero
+        exit when `check` is set; returns the exit code otherwise.
+        """
+        process = await asyncio.create_subprocess_exec(
+            'git', *args,
+            cwd=self.local_repo_path,
+            env={**os.environ, **env} if env else None,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stderr_tail = deque(maxlen=50)
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    self._pump_stream(process.stderr, "GIT", stderr_tail),
+                    process.wait()
+                ),
+                timeout=120
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RuntimeError(f"git {args[0]} timed out after 120s")
+        if check and process.returncode != 0:
+            raise subprocess.CalledProcessError(
+                process.returncode, ['git', *args],
+                stderr='\n'.join(stderr_tail)
+            )
+        return process.returncode
+
+    async def _git_sync_and_push(self, remote_url: str):
+        """Init (if needed), commit any changes and push them to Gitea.
+
+        Force is only used when the local history no longer descends from
+        origin/main (e.g. re-initialised repo). A failed fetch raises, since
+        the force decision depends on the fetched origin/main.
+        """
+        # Initialize git repo if not already valid (Copier may create empty .git/hooks/)
+        git_dir = Path(self.local_repo_path) / '.git'
+        user_name = self.admin_username
+        user_email = f'{self.admin_username}@{self.domain}'
+        if not (git_dir / 'HEAD').is_file():
+            await asyncio.to_thread(shutil.rmtree, git_dir, True)
+            await self._git('init', '-b', 'main')
+            # Repo-local identity for developers committing from the workspace.
+            # It never changes afterwards, so redeploys skip these execs.
+            # Both write .git/config, which git locks per write - keep them sequential
+            await self._git('config', 'user.name', user_name)
+            await self._git('config', 'user.email', user_email)
+
+        if await self._git('remote', 'set-url', 'origin', remote_url, check=False) != 0:
+            await self._git('remote', 'add', 'origin', remote_url)
+
+        await self._git('add', '-A')
+        # Only commit if there are changes
+        # --no-verify: skip pre-commit hook (designed for developer commits, not
+        # automated deploys — Copier already ran in Phase 1B, and hooks add a
+        # timing window for HEAD CAS races on the shared PVC)
+        if await self._git('diff', '--cached', '--quiet', check=False) != 0:
+            # Deploy identity passed per commit, independent of the repo config
+            await self._git(
+                'commit', '--no-verify', '-m', f'Deploy {self.app_name} to {self.domain}',
+                env={
+                    'GIT_AUTHOR_NAME': user_name, 'GIT_AUTHOR_EMAIL': user_email,
+                    'GIT_COMMITTER_NAME': user_name, 'GIT_COMMITTER_EMAIL': user_email,
+                }
+            )
+        # Fetch remote refs before push to sync tracking refs without touching
+        # the working tree (avoids stale refs/remotes/origin/main conflicts).
+        # The force decision below depends on it, so a failed fetch fails the push.
+        await self._git('fetch', '--prune', 'origin')
+
+        push_args = ['push', '-u', 'origin', 'main']
+        # A freshly created (empty) Gitea repo fetches cleanly with no refs, and
+        # --prune drops any origin/main left from an earlier repo, so a missing
+        # origin/main means the remote has no main yet: a plain push creates it.
+        if await self._git('rev-parse', '--verify', '--quiet', 'refs/remotes/origin/main', check=False) == 0:
+            if await self._git('merge-base', '--is-ancestor', 'refs/remotes/origin/main', 'HEAD', check=False) != 0:
+                push_args.append('--force')
+        await self._git(*push_args)
 
     async def git_commit_and_push(self):
         """Commit and push changes to Gitea using unique repository name."""
-        gitea_token = self._decode_secret_data(self.secrets['gitea'], 'token')
+        gitea_token = self.secrets['gitea_plain'].get('token')
         gitea_hostname = f"git.{self.domain}"
         org = "thinkube-deployments"
+        remote_url = f"https://{self.admin_username}:{gitea_token}@{gitea_hostname}/{org}/{self.gitea_repo_name}.git"
 
         max_retries = 3
         for attempt in range(max_retries):
-            # Initialize git repo if not already valid (Copier may create empty .git/hooks/)
-            git_script = f"""
-set -e
-cd {self.local_repo_path}
-if [ ! -f .git/HEAD ]; then
-  rm -rf .git
-  git init -b main
-fi
-git config user.name '{self.admin_username}'
-git config user.email '{self.admin_username}@{self.domain}'
-git remote set-url origin 'https://{self.admin_username}:{gitea_token}@{gitea_hostname}/{org}/{self.gitea_repo_name}.git' 2>/dev/null || \
-git remote add origin 'https://{self.admin_username}:{gitea_token}@{gitea_hostname}/{org}/{self.gitea_repo_name}.git'
-
-git add -A
-# Only commit if there are changes
-# --no-verify: skip pre-commit hook (designed for developer commits, not
-# automated deploys — Copier already ran in Phase 1B, and hooks add a
-# timing window for HEAD CAS races on the shared PVC)
-if ! git diff --cached --quiet; then
-  git commit --no-verify -m 'Deploy {self.app_name} to {self.domain}'
-fi
-# Fetch remote refs before push to sync tracking refs without touching
-# the working tree (avoids stale refs/remotes/origin/main conflicts)
-git fetch origin 2>/dev/null || true
-git push -u origin main --force
-"""
-
-            # Run git operations in thread pool to avoid blocking the event loop
-            loop = asyncio.get_event_loop()
-
-            with ThreadPoolExecutor(max_workers=1) as executor:
-                returncode, stdout, stderr = await loop.run_in_executor(
-                    executor,
-                    partial(self._run_git_sync, git_script, self.local_repo_path)
-                )
-
-            if returncode == 0:
+            try:
+                await self._git_sync_and_push(remote_url)
                 DeploymentLogger.success("Pushed changes to Gitea")
                 return
+            except subprocess.CalledProcessError as e:
+                stderr = e.stderr or ''
 
             # Recoverable errors — retry
             recoverable = False
@@ -1810,28 +2243,102 @@ git push -u origin main --force
         raise RuntimeError(f"Git push failed after {max_retries} attempts")
 
     async def _get_existing_workflow_names(self) -> set:
-        """Get set of existing workflow names for this app."""
+        """Get set of existing workflow names for this app.
+
+        Only names are needed, so the list asks for PartialObjectMetadataList
+        (no spec/status - a workflow's status.nodes is most of its size) and is
+        served from the apiserver watch cache (resourceVersion=0). Any failure
+        means "no snapshot" rather than failing the deployment.
+        """
+        list_kwargs = dict(
+            group="argoproj.io",
+            version="v1alpha1",
+            namespace="argo",
+            plural="workflows",
+            label_selector=f"thinkube.io/app-name={self.app_name}",
+            resource_version='0',
+            _preload_content=False
+        )
         try:
-            workflows = await self.k8s_custom.list_namespaced_custom_object(
-                group="argoproj.io",
-                version="v1alpha1",
-                namespace="argo",
-                plural="workflows",
-                label_selector=f"thinkube.io/app-name={self.app_name}"
-            )
+            try:
+                resp = await self.k8s_custom.list_namespaced_custom_object(
+                    _headers={'Accept': PARTIAL_METADATA_LIST_ACCEPT}, **list_kwargs
+                )
+            except TypeError:
+                # Client without per-call headers: full objects, same names
+                resp = await self.k8s_custom.list_namespaced_custom_object(**list_kwargs)
+            try:
+                workflows = _json_loads(await resp.read())
+            finally:
+                resp.release()
+            self._workflows_rv = workflows.get('metadata', {}).get('resourceVersion')
             return {item['metadata']['name'] for item in workflows.get('items', [])}
-        except ApiException:
+        except Exception as e:
+            DeploymentLogger.log(f"Could not snapshot existing workflows ({e}), continuing without one")
+            self._workflows_rv = None
             return set()
 
     async def wait_for_workflow_trigger(self, timeout: int = 60, exclude_workflows: set = None) -> str:
-        """Wait for webhook to trigger a NEW Argo Workflow."""
+        """Wait for webhook to trigger a NEW Argo Workflow.
+
+        Watches the app's workflows so the apiserver pushes the ADDED event;
+        falls back to polling if the watch connection fails.
+        """
         DeploymentLogger.log("Waiting for webhook to trigger build workflow...")
 
         if exclude_workflows is None:
             exclude_workflows = set()
 
-        start_time = asyncio.get_event_loop().time()
-        workflow_name = None
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+
+        try:
+            workflow_name = await asyncio.wait_for(
+                self._watch_for_new_workflow(exclude_workflows, timeout), timeout
+            )
+            if workflow_name:
+                DeploymentLogger.success(f"Workflow triggered: {workflow_name}")
+                return workflow_name
+        except asyncio.TimeoutError:
+            DeploymentLogger.error(f"Timeout waiting for workflow to trigger after {timeout}s")
+            raise TimeoutError("Workflow was not triggered within timeout period")
+        except (ApiException, aiohttp.ClientError) as e:
+            DeploymentLogger.log(f"Workflow watch unavailable ({e}), falling back to polling")
+
+        return await self._poll_for_new_workflow(exclude_workflows, deadline, timeout)
+
+    async def _watch_for_new_workflow(self, exclude_workflows: set, timeout: int) -> Optional[str]:
+        """Return the first workflow for this app not in `exclude_workflows`, or None if the watch ends.
+
+        When the pre-push snapshot's resourceVersion is known the watch resumes
+        from it, so the apiserver only sends workflows created after the
+        snapshot instead of replaying every existing (full) workflow object.
+        """
+        watch_kwargs = {}
+        if self._workflows_rv:
+            watch_kwargs['resource_version'] = self._workflows_rv
+        async with watch.Watch() as w:
+            async for event in w.stream(
+                self.k8s_custom.list_namespaced_custom_object,
+                group="argoproj.io",
+                version="v1alpha1",
+                namespace="argo",
+                plural="workflows",
+                label_selector=f"thinkube.io/app-name={self.app_name}",
+                timeout_seconds=timeout,
+                **watch_kwargs
+            ):
+                if event['type'] != 'ADDED':
+                    continue
+                name = event['object']['metadata']['name']
+                if name not in exclude_workflows:
+                    return name
+        return None
+
+    async def _poll_for_new_workflow(self, exclude_workflows: set, deadline: float, timeout: int) -> str:
+        """Polling fallback for wait_for_workflow_trigger."""
+        loop = asyncio.get_event_loop()
+        delay = POLL_BACKOFF_INITIAL
 
         while True:
             try:
@@ -1851,33 +2358,129 @@ git push -u origin main --force
                 if new_workflows:
                     # Sort by creation timestamp, get latest
                     new_workflows.sort(key=lambda x: x['metadata']['creationTimestamp'], reverse=True)
-                    latest = new_workflows[0]
-                    workflow_name = latest['metadata']['name']
-
+                    workflow_name = new_workflows[0]['metadata']['name']
                     DeploymentLogger.success(f"Workflow triggered: {workflow_name}")
-                    break
+                    return workflow_name
 
             except ApiException as e:
                 if e.status != 404:
                     DeploymentLogger.error(f"Error checking for workflow: {e}")
 
             # Check timeout
-            if asyncio.get_event_loop().time() - start_time > timeout:
+            if loop.time() > deadline:
                 DeploymentLogger.error(f"Timeout waiting for workflow to trigger after {timeout}s")
                 raise TimeoutError("Workflow was not triggered within timeout period")
 
-            await asyncio.sleep(2)
+            await asyncio.sleep(min(delay * random.uniform(0.75, 1.25), max(deadline - loop.time(), 0)))
+            delay = min(delay * POLL_BACKOFF_FACTOR, POLL_BACKOFF_MAX)
 
-        return workflow_name
+    def _report_workflow_progress(self, workflow: dict, argo_ui_url: str) -> bool:
+        """Log new node transitions of a workflow; return True once it has succeeded.
+
+        Raises RuntimeError if the workflow failed.
+        """
+        workflow_name = workflow['metadata']['name']
+        status = workflow.get('status', {})
+        phase = status.get('phase')
+        nodes = status.get('nodes', {})
+
+        # Report node phase changes (keyed by the stable node id)
+        for node_id, node in nodes.items():
+            node_phase = node.get('phase')
+
+            if self._node_phase.get(node_id) != node_phase:
+                self._node_phase[node_id] = node_phase
+                self._node_transitions += 1
+                node_name = node.get('displayName', node.get('name', 'unknown'))
+
+                if node_phase == 'Running':
+                    DeploymentLogger.log(f"  ⚙️  {node_name}: Running")
+                elif node_phase == 'Succeeded':
+                    DeploymentLogger.log(f"  ✅ {node_name}: Succeeded")
+                elif node_phase in ['Failed', 'Error']:
+                    DeploymentLogger.error(f"  ❌ {node_name}: {node_phase}")
+
+        # Check overall workflow status
+        if phase == 'Succeeded':
+            DeploymentLogger.success("🎉 Build workflow completed successfully!")
+            DeploymentLogger.log(f"🔗 View details: {argo_ui_url}")
+            return True
+
+        elif phase in ['Failed', 'Error']:
+            message = status.get('message', 'No error message')
+            DeploymentLogger.error(f"❌ Build workflow failed: {message}")
+            DeploymentLogger.error(f"🔗 View failure details: {argo_ui_url}")
+            raise RuntimeError(f"Workflow {workflow_name} failed: {message}")
+
+        elif phase in ['Pending', 'Running', None]:
+            # Still running, continue monitoring
+            pass
+
+        else:
+            DeploymentLogger.log(f"Workflow status: {phase}")
+
+        return False
 
     async def monitor_workflow(self, workflow_name: str):
-        """Monitor Argo Workflow execution and stream status."""
+        """Monitor Argo Workflow execution and stream status.
+
+        Status changes are pushed by a watch on the single workflow object;
+        if the watch fails, monitoring falls back to periodic GETs.
+        """
         argo_ui_url = f"https://argo.{self.domain}/workflows/argo/{workflow_name}"
         DeploymentLogger.log(f"🔗 Argo Workflow UI: {argo_ui_url}")
 
-        last_reported_nodes = set()
+        self._node_phase = {}
+        self._node_transitions = 0
+
+        try:
+            if await self._watch_workflow(workflow_name, argo_ui_url):
+                return
+        except (ApiException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            DeploymentLogger.log(f"Workflow watch interrupted ({e}), falling back to polling")
+
+        await self._poll_workflow(workflow_name, argo_ui_url)
+
+    async def _watch_workflow(self, workflow_name: str, argo_ui_url: str) -> bool:
+        """Follow one workflow via watch events; True on success, False if the watch errored.
 
+        Each re-established watch window resumes from the last resourceVersion
+        seen (kept fresh by bookmarks), so the full workflow object is only
+        sent again when it actually changed.
+        """
+        resource_version = None
+        while True:
+            watch_kwargs = {'allow_watch_bookmarks': True}
+            if resource_version:
+                watch_kwargs['resource_version'] = resource_version
+            async with watch.Watch() as w:
+                async for event in w.stream(
+                    self.k8s_custom.list_namespaced_custom_object,
+                    group="argoproj.io",
+                    version="v1alpha1",
+                    namespace="argo",
+                    plural="workflows",
+                    field_selector=f"metadata.name={workflow_name}",
+                    timeout_seconds=WORKFLOW_WATCH_TIMEOUT,
+                    **watch_kwargs
+                ):
+                    if event['type'] == 'ERROR':
+                        return False
+                    resource_version = event['object'].get('metadata', {}).get('resourceVersion', resource_version)
+                    if event['type'] == 'BOOKMARK':
+                        continue
+                    if event['type'] == 'DELETED':
+                        DeploymentLogger.error(f"Workflow {workflow_name} not found")
+                        raise RuntimeError(f"Workflow {workflow_name} was deleted")
+                    if self._report_workflow_progress(event['object'], argo_ui_url):
+                        return True
+            # Server closed the watch window while the build is still running - re-establish
+
+    async def _poll_workflow(self, workflow_name: str, argo_ui_url: str):
+        """Polling fallback for monitor_workflow."""
+        delay = POLL_BACKOFF_INITIAL
         while True:
+            seen = self._node_transitions
             try:
                 workflow = await self.k8s_custom.get_namespaced_custom_object(
                     group="argoproj.io",
@@ -1886,45 +2489,8 @@ git push -u origin main --force
                     plural="workflows",
                     name=workflow_name
                 )
-
-                status = workflow.get('status', {})
-                phase = status.get('phase')
-                nodes = status.get('nodes', {})
-
-                # Report new node statuses
-                for node_id, node in nodes.items():
-                    node_name = node.get('displayName', node.get('name', 'unknown'))
-                    node_phase = node.get('phase')
-                    node_key = f"{node_name}:{node_phase}"
-
-                    if node_key not in last_reported_nodes:
-                        last_reported_nodes.add(node_key)
-
-                        if node_phase == 'Running':
-                            DeploymentLogger.log(f"  ⚙️  {node_name}: Running")
-                        elif node_phase == 'Succeeded':
-                            DeploymentLogger.log(f"  ✅ {node_name}: Succeeded")
-                        elif node_phase in ['Failed', 'Error']:
-                            DeploymentLogger.error(f"  ❌ {node_name}: {node_phase}")
-
-                # Check overall workflow status
-                if phase == 'Succeeded':
-                    DeploymentLogger.success("🎉 Build workflow completed successfully!")
-                    DeploymentLogger.log(f"🔗 View details: {argo_ui_url}")
-                    break
-
-                elif phase in ['Failed', 'Error']:
-                    message = status.get('message', 'No error message')
-                    DeploymentLogger.error(f"❌ Build workflow failed: {message}")
-                    DeploymentLogger.error(f"🔗 View failure details: {argo_ui_url}")
-                    raise RuntimeError(f"Workflow {workflow_name} failed: {message}")
-
-                elif phase in ['Pending', 'Running']:
-                    # Still running, continue monitoring
-                    pass
-
-                else:
-                    DeploymentLogger.log(f"Workflow status: {phase}")
+                if self._report_workflow_progress(workflow, argo_ui_url):
+                    return
 
             except ApiException as e:
                 if e.status == 404:
@@ -1933,7 +2499,12 @@ git push -u origin main --force
                 else:
                     DeploymentLogger.error(f"Error monitoring workflow: {e}")
 
-            await asyncio.sleep(5)
+            # Active workflows (new node transitions) are polled fast again;
+            # long-running steps relax towards POLL_BACKOFF_MAX
+            if self._node_transitions != seen:
+                delay = POLL_BACKOFF_INITIAL
+            await asyncio.sleep(delay * random.uniform(0.75, 1.25))
+            delay = min(delay * POLL_BACKOFF_FACTOR, POLL_BACKOFF_MAX)
 
     # ==================== PHASE 5: Service Discovery ====================
 
@@ -1947,11 +2518,35 @@ git push -u origin main --force
         DeploymentLogger.success("Phase 5 complete - application deployed")
 
     async def deploy_argocd_app(self):
-        """Create ArgoCD application with SSH setup (matches Ansible argocd role)."""
+        """Create ArgoCD application with SSH setup (matches Ansible argocd role).
+
+        The repo-server is only restarted when the repository secret actually
+        changed; the restart is kicked off as soon as the secret exists and the
+        Application is applied while it rolls. Both are done before this
+        returns so the git push never races ArgoCD.
+        """
+        ssh_repo_url, changed = await self._ensure_argocd_ssh_secret()
+        if not changed:
+            DeploymentLogger.log("SSH secret unchanged, skipping repo-server restart")
+            await self._create_argocd_application(ssh_repo_url)
+            return
+
+        restart_task = asyncio.create_task(self._restart_repo_server())
+        try:
+            await self._create_argocd_application(ssh_repo_url)
+        finally:
+            await restart_task
+
+    async def _ensure_argocd_ssh_secret(self) -> tuple:
+        """Create/update the ArgoCD repository secret.
+
+        Returns (ssh_repo_url, changed); changed is False when the existing
+        secret already holds the same URL and key (nothing written).
+        """
         gitea_hostname = f"git.{self.domain}"
         argocd_namespace = "argocd"
 
-        # Step 1: Get gitea-ssh-key from argo namespace
+        # Get gitea-ssh-key from argo namespace
         try:
             gitea_ssh_secret = await self.k8s_core.read_namespaced_secret('gitea-ssh-key', 'argo')
             ssh_private_key = self._decode_secret_data(gitea_ssh_secret, 'ssh-privatekey')
@@ -1959,32 +2554,37 @@ git push -u origin main --force
             DeploymentLogger.error(f"Failed to get gitea-ssh-key from argo namespace: {e}")
             raise
 
-        # Step 2: Create SSH repository secret for ArgoCD
+        # Create SSH repository secret for ArgoCD
         ssh_secret_name = f"gitea-{self.app_name}-ssh"
         ssh_repo_url = f"ssh://git@{gitea_hostname}:2222/thinkube-deployments/{self.gitea_repo_name}.git"
-
-        ssh_secret = client.V1Secret(
-            metadata=client.V1ObjectMeta(
-                name=ssh_secret_name,
-                namespace=argocd_namespace,
-                labels={'argocd.argoproj.io/secret-type': 'repository'}
-            ),
-            string_data={
-                'url': ssh_repo_url,
-                'sshPrivateKey': ssh_private_key,
-                'type': 'git'
-            }
-        )
+        desired = {
+            'url': ssh_repo_url,
+            'sshPrivateKey': ssh_private_key,
+            'type': 'git'
+        }
 
         try:
-            await self.k8s_core.create_namespaced_secret(argocd_namespace, ssh_secret)
-            DeploymentLogger.log(f"Created SSH secret: {ssh_secret_name}")
+            existing = await self.k8s_core.read_namespaced_secret(ssh_secret_name, argocd_namespace)
         except ApiException as e:
-            if e.status == 409:
-                await self.k8s_core.replace_namespaced_secret(ssh_secret_name, argocd_namespace, ssh_secret)
-                DeploymentLogger.log(f"Updated SSH secret: {ssh_secret_name}")
+            if e.status != 404:
+                raise
+            existing = None
+        if existing is not None and self._materialize_secret(existing) == desired:
+            return ssh_repo_url, False
+
+        await self._apply_secret({
+            'metadata': {
+                'name': ssh_secret_name,
+                'namespace': argocd_namespace,
+                'labels': {'argocd.argoproj.io/secret-type': 'repository'}
+            },
+            'stringData': desired
+        })
 
-        # Step 3: Restart argocd-repo-server to pick up SSH config
+        return ssh_repo_url, True
+
+    async def _restart_repo_server(self):
+        """Restart argocd-repo-server to pick up SSH config."""
         try:
             # Patch the deployment to trigger a restart (update an annotation)
             patch_body = {
@@ -2000,7 +2600,7 @@ git push -u origin main --force
             }
             await self.k8s_apps.patch_namespaced_deployment(
                 name='argocd-repo-server',
-                namespace=argocd_namespace,
+                namespace='argocd',
                 body=patch_body
             )
             DeploymentLogger.log("Restarted argocd-repo-server to pick up SSH config")
@@ -2010,7 +2610,9 @@ git push -u origin main --force
         except ApiException as e:
             DeploymentLogger.error(f"Failed to restart argocd-repo-server: {e}")
 
-        # Step 4: Create ArgoCD Application with SSH URL
+    async def _create_argocd_application(self, ssh_repo_url: str):
+        """Create ArgoCD Application with SSH URL."""
+        argocd_namespace = "argocd"
         argocd_app = {
             'apiVersion': 'argoproj.io/v1alpha1',
             'kind': 'Application',
@@ -2036,151 +2638,135 @@ git push -u origin main --force
             }
         }
 
-        try:
-            await self.k8s_custom.create_namespaced_custom_object(
-                group="argoproj.io",
-                version="v1alpha1",
-                namespace=argocd_namespace,
-                plural="applications",
-                body=argocd_app
-            )
-            DeploymentLogger.success(f"Created ArgoCD application: {self.app_name}")
-        except ApiException as e:
-            if e.status == 409:
-                # Application already exists - use patch for idempotent updates
-                # Patch avoids optimistic concurrency conflicts from ArgoCD controller
-                try:
-                    await self.k8s_custom.patch_namespaced_custom_object(
-                        group="argoproj.io",
-                        version="v1alpha1",
-                        namespace=argocd_namespace,
-                        plural="applications",
-                        name=self.app_name,
-                        body=argocd_app
-                    )
-                    DeploymentLogger.log(f"ArgoCD application '{self.app_name}' already exists - verified configuration")
-                except ApiException as patch_error:
-                    # If patch also fails, log warning but don't fail deployment
-                    # The app exists and will be synced by the Harbor webhook
-                    DeploymentLogger.log(f"ArgoCD application '{self.app_name}' already exists (patch skipped: {patch_error.status})")
-            else:
-                # Other errors should fail the deployment
-                raise
+        # Server-side apply: one round-trip whether or not the Application
+        # exists; only our fields are owned, so ArgoCD's status/operation
+        # writes never conflict (and force=True rules out 409s). Any error
+        # fails the deployment.
+        await self.k8s_custom.patch_namespaced_custom_object(
+            group="argoproj.io",
+            version="v1alpha1",
+            namespace=argocd_namespace,
+            plural="applications",
+            name=self.app_name,
+            body=argocd_app,
+            field_manager=FIELD_MANAGER,
+            force=True,
+            _content_type=APPLY_PATCH_CONTENT_TYPE
+        )
+        DeploymentLogger.success(f"Applied ArgoCD application: {self.app_name}")
 
     async def setup_service_discovery(self):
         """Setup service discovery via thinkube-control API."""
         # Use MCP default token for API authentication
         try:
-            mcp_secret = await self.k8s_core.read_namespaced_secret('mcp-default-token', 'thinkube-control')
-            api_token = self._decode_secret_data(mcp_secret, 'token')
+            api_token = await self._get_mcp_token()
         except ApiException:
             DeploymentLogger.error("MCP default token not found, skipping service discovery")
             return
         control_base = f"https://control.{self.domain}"
         app_host = f"{self.app_name}.{self.domain}"
 
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                'Authorization': f'Bearer {api_token}',
-                'Content-Type': 'application/json'
-            }
+        session = self._http_session()
+        headers = {
+            'Authorization': f'Bearer {api_token}',
+            'Content-Type': 'application/json'
+        }
 
-            # Step 1: Generate service discovery YAML via API
-            generate_url = f"{control_base}/api/v1/config/service-discovery/generate-configmap-yaml"
-            body = {
-                'app_name': self.app_name,
-                'app_host': app_host,
-                'k8s_namespace': self.namespace,
-                'template_url': self.template_url,
-                'project_description': self.params.get('project_description', ''),
-                'deployment_date': datetime.now().isoformat(),
-                'containers': self.thinkube_config.get('spec', {}).get('containers', [])
-            }
+        # Step 1: Generate service discovery YAML via API
+        generate_url = f"{control_base}/api/v1/config/service-discovery/generate-configmap-yaml"
+        body = {
+            'app_name': self.app_name,
+            'app_host': app_host,
+            'k8s_namespace': self.namespace,
+            'template_url': self.template_url,
+            'project_description': self.params.get('project_description', ''),
+            'deployment_date': datetime.now().isoformat(),
+            'containers': self.thinkube_config.get('spec', {}).get('containers', [])
+        }
 
-            yaml_content = None
-            async with session.post(generate_url, headers=headers, json=body, ssl=False) as resp:
-                if resp.status == 200:
-                    result = await resp.json()
-                    yaml_content = result.get('yaml_content', '')
-                    DeploymentLogger.log("Generated service discovery YAML")
-                else:
-                    error_text = await resp.text()
-                    DeploymentLogger.error(f"Failed to generate service discovery YAML: {resp.status} - {error_text}")
-
-            # Step 2: Create ConfigMap with the generated YAML
-            if yaml_content:
-                discovery_cm = client.V1ConfigMap(
-                    metadata=client.V1ObjectMeta(
-                        name='thinkube-service-config',
-                        namespace=self.namespace,
-                        labels={
-                            'app': self.app_name,
-                            'thinkube.io/managed': 'true',
-                            'thinkube.io/service-type': 'component' if self._is_component() else 'user_app',
-                            'thinkube.io/service-name': self.app_name
-                        }
-                    ),
-                    data={'service.yaml': yaml_content}
+        yaml_content = None
+        async with session.post(generate_url, headers=headers, json=body) as resp:
+            if resp.status == 200:
+                result = await resp.json()
+                yaml_content = result.get('yaml_content', '')
+                DeploymentLogger.log("Generated service discovery YAML")
+            else:
+                error_text = await resp.text()
+                DeploymentLogger.error(f"Failed to generate service discovery YAML: {resp.status} - {error_text}")
+
+        # Step 2: Create ConfigMap with the generated YAML
+        if yaml_content:
+            discovery_cm = {
+                'apiVersion': 'v1',
+                'kind': 'ConfigMap',
+                'metadata': {
+                    'name': 'thinkube-service-config',
+                    'namespace': self.namespace,
+                    'labels': {
+                        'app': self.app_name,
+                        'thinkube.io/managed': 'true',
+                        'thinkube.io/service-type': 'component' if self._is_component() else 'user_app',
+                        'thinkube.io/service-name': self.app_name
+                    }
+                },
+                'data': {'service.yaml': yaml_content}
+            }
+            try:
+                await self.k8s_core.patch_namespaced_config_map(
+                    'thinkube-service-config', self.namespace, discovery_cm,
+                    field_manager=FIELD_MANAGER,
+                    force=True,
+                    _content_type=APPLY_PATCH_CONTENT_TYPE
                 )
-
-                try:
-                    await self.k8s_core.create_namespaced_config_map(self.namespace, discovery_cm)
-                    DeploymentLogger.log("Created thinkube-service-config ConfigMap")
-                except ApiException as e:
-                    if e.status == 409:
-                        await self.k8s_core.replace_namespaced_config_map(
-                            'thinkube-service-config', self.namespace, discovery_cm
-                        )
-                        DeploymentLogger.log("Updated thinkube-service-config ConfigMap")
-
-            # Step 3: Trigger service sync to register app immediately
-            sync_url = f"{control_base}/api/v1/services/sync"
-            async with session.post(sync_url, headers=headers, ssl=False) as resp:
-                if resp.status in [200, 201]:
-                    DeploymentLogger.success("Service discovery sync triggered - app registered")
-                else:
-                    DeploymentLogger.log("Service sync trigger failed (app will appear via auto-discovery within 5 min)")
+                DeploymentLogger.log("Applied thinkube-service-config ConfigMap")
+            except ApiException as e:
+                DeploymentLogger.error(f"Failed to apply thinkube-service-config ConfigMap: {e.status}")
+
+        # Step 3: Trigger service sync to register app immediately.
+        # Must follow the ConfigMap apply: ServiceDiscovery.discover_all() reads
+        # thinkube-service-config, so an overlapping sync would register the
+        # app without it and leave it to the 5-minute auto-discovery.
+        sync_url = f"{control_base}/api/v1/services/sync"
+        async with session.post(sync_url, headers=headers) as resp:
+            if resp.status in [200, 201]:
+                DeploymentLogger.success("Service discovery sync triggered - app registered")
+            else:
+                DeploymentLogger.log("Service sync trigger failed (app will appear via auto-discovery within 5 min)")
 
 
     # ==================== Main Orchestration ====================
 
     async def list_existing_deployments(self):
-        """List existing deployments for this app from the database."""
+        """List existing deployments for this app from the database (debug aid)."""
+        if asyncpg is None:
+            DeploymentLogger.debug(" asyncpg not installed, not listing existing deployments")
+            return
         try:
             postgres_secret = await self.k8s_core.read_namespaced_secret('postgresql-app', 'postgres')
             db_password = self._decode_secret_data(postgres_secret, 'password')
             db_user = self._decode_secret_data(postgres_secret, 'username')
 
-            # Query PostgreSQL for existing deployments
-            query_script = f"""
-export PGPASSWORD="{db_password}"
-psql -h postgres.{self.domain} -U {db_user} -d control_hub -t -c "
-SELECT
-    id::text,
-    name,
-    status,
-    created_at::text,
-    started_at::text,
-    completed_at::text
-FROM template_deployments
-WHERE name = '{self.app_name}'
-ORDER BY created_at DESC
-LIMIT 5;"
-"""
-
-            result = subprocess.run(
-                query_script,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
+            # Query PostgreSQL for existing deployments (bound parameter, no shell)
+            conn = await self._connect_postgres(db_user, db_password, 'control_hub')
+            try:
+                rows = await conn.fetch(
+                    """
+                    SELECT id::text, name, status, created_at::text,
+                           started_at::text, completed_at::text
+                    FROM template_deployments
+                    WHERE name = $1
+                    ORDER BY created_at DESC
+                    LIMIT 5
+                    """,
+                    self.app_name
+                )
+            finally:
+                await conn.close()
 
-            if result.returncode == 0 and result.stdout.strip():
+            if rows:
                 DeploymentLogger.debug(f" Found existing deployments for {self.app_name}:")
-                for line in result.stdout.strip().split('\n'):
-                    if line.strip():
-                        DeploymentLogger.debug(f"   {line.strip()}")
+                for row in rows:
+                    DeploymentLogger.debug(f"   {' | '.join(str(v) for v in row.values())}")
             else:
                 DeploymentLogger.debug(f" No existing deployments found for {self.app_name}")
 
@@ -2190,33 +2776,33 @@ LIMIT 5;"
     async def list_existing_gitea_repos(self):
         """List existing Gitea repositories for this app."""
         try:
-            gitea_token = self._decode_secret_data(self.secrets['gitea'], 'token')
+            gitea_token = self.secrets['gitea_plain'].get('token')
             gitea_hostname = f"git.{self.domain}"
             org = "thinkube-deployments"
 
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    'Authorization': f'token {gitea_token}',
-                    'Content-Type': 'application/json'
-                }
+            session = self._http_session()
+            headers = {
+                'Authorization': f'token {gitea_token}',
+                'Content-Type': 'application/json'
+            }
 
-                # List all repos in the organization
-                list_url = f"https://{gitea_hostname}/api/v1/orgs/{org}/repos"
-                async with session.get(list_url, headers=headers, ssl=False) as resp:
-                    if resp.status == 200:
-                        repos = await resp.json()
-                        # Filter repos that match this app name
-                        matching_repos = [r for r in repos if r['name'].startswith(f"{self.app_name}-")]
-
-                        if matching_repos:
-                            DeploymentLogger.debug(f" Found {len(matching_repos)} existing Gitea repos for {self.app_name}:")
-                            for repo in matching_repos:
-                                DeploymentLogger.debug(f"   {repo['name']} (created: {repo.get('created_at', 'unknown')})")
-                        else:
-                            DeploymentLogger.debug(f" No existing Gitea repos found for {self.app_name}")
+            # List all repos in the organization
+            list_url = f"https://{gitea_hostname}/api/v1/orgs/{org}/repos"
+            async with session.get(list_url, headers=headers) as resp:
+                if resp.status == 200:
+                    repos = await resp.json()
+                    # Filter repos that match this app name
+                    matching_repos = [r for r in repos if r['name'].startswith(f"{self.app_name}-")]
+
+                    if matching_repos:
+                        DeploymentLogger.debug(f" Found {len(matching_repos)} existing Gitea repos for {self.app_name}:")
+                        for repo in matching_repos:
+                            DeploymentLogger.debug(f"   {repo['name']} (created: {repo.get('created_at', 'unknown')})")
                     else:
-                        error_text = await resp.text()
-                        DeploymentLogger.debug(f" Could not list Gitea repos: {resp.status} - {error_text}")
+                        DeploymentLogger.debug(f" No existing Gitea repos found for {self.app_name}")
+                else:
+                    error_text = await resp.text()
+                    DeploymentLogger.debug(f" Could not list Gitea repos: {resp.status} - {error_text}")
 
         except Exception as e:
             DeploymentLogger.debug(f" Could not query Gitea repos: {e}")
@@ -2271,10 +2857,17 @@ LIMIT 5;"
             DeploymentLogger.error(f"Deployment failed: {e}")
             DeploymentLogger.debug(f" Exception type: {type(e).__name__}")
             DeploymentLogger.debug(f" Returning exit code 1")
-            import traceback
-            traceback.print_exc()
+            # Innermost frames only, emitted through the logger so every line
+            # carries the usual timestamp/level prefix
+            for line in ''.join(
+                traceback.format_exception(type(e), e, e.__traceback__, limit=-TRACEBACK_FRAME_LIMIT)
+            ).splitlines():
+                DeploymentLogger.log(line, "TRACEBACK")
             return 1
         finally:
+            for task in (self._kc_task, self._gitea_task):
+                if task and not task.done():
+                    task.cancel()
             await self.cleanup_k8s_clients()
 
 
@@ -2287,8 +2880,8 @@ async def main():
     params_file = sys.argv[1]
 
     try:
-        with open(params_file, 'r') as f:
-            params = json.load(f)
+        with open(params_file, 'rb') as f:
+            params = _json_loads(f.read())
     except Exception as e:
         DeploymentLogger.error(f"Failed to load parameters: {e}")
         sys.exit(1)
@@ -2302,4 +2895,10 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    if uvloop is not None and hasattr(uvloop, 'run'):
+        uvloop.run(main())
+    else:
+        if uvloop is not None:
+            # uvloop < 0.18 has no run(); install its event loop policy instead
+            uvloop.install()
+        asyncio.run(main())